@@ -1,13 +1,20 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import timedelta, datetime
 from typing import Annotated, List
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Users, UserRole
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
 
+import ratelimit
 from database import get_db
 
 router = APIRouter(
@@ -18,9 +25,139 @@ router = APIRouter(
 SECRETE_KEY = "ahp9348rh24903hrf23tfg2894tpg34pgh4g4gyes45yh5sej5jjjjts"
 ALGORITHM = 'HS256'
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# bcrypt cost factor. Raising it makes existing hashes "need update": they are
+# transparently rehashed with the new cost on the user's next successful login.
+BCRYPT_ROUNDS = 12
+
+# bcrypt takes 100-300 ms of CPU per call, so it runs on its own bounded pool
+# instead of the event loop (bcrypt releases the GIL while hashing).
+HASH_WORKERS = 4
+
+# At most LOGIN_CONCURRENCY logins hash at once and LOGIN_QUEUE more may wait;
+# anything beyond that is answered with 429.
+LOGIN_CONCURRENCY = HASH_WORKERS
+LOGIN_QUEUE = 32
+LOGIN_RETRY_AFTER = 1  # seconds
+
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
+TOKEN_CACHE_MAXSIZE = 10000
+
+
+class TokenCache:
+    """Bounded cache of verified token claims, each entry expiring at the token's `exp`.
+
+    A hit costs one dictionary lookup instead of a full jwt.decode. Revoked tokens
+    are evicted immediately and remembered until they expire. Revoking a user bumps
+    the user's generation, which invalidates every token carrying an older one.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._claims = OrderedDict()  # token -> (exp, user dict)
+        self._revoked_tokens = {}  # token -> exp
+        self._generations = {}  # user id -> tokens whose 'gen' claim is lower are invalid
+
+    def get(self, token: str):
+        entry = self._claims.get(token)
+        if entry is not None and entry[0] > time.time():
+            self.hits += 1
+            self._claims.move_to_end(token)
+            return entry[1]
+        if entry is not None:
+            del self._claims[token]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, exp: float, user: dict):
+        self._claims[token] = (exp, user)
+        if len(self._claims) > self.maxsize:
+            self._claims.popitem(last=False)
+
+    def is_revoked(self, token: str, payload: dict) -> bool:
+        if token in self._revoked_tokens:
+            return True
+        return payload.get('gen', 0) < self.generation(payload.get('id'))
+
+    def generation(self, user_id) -> int:
+        """Token generation of a user, stamped into new tokens as the 'gen' claim."""
+        return self._generations.get(user_id, 0)
+
+    def revoke_token(self, token: str, exp: float):
+        now = time.time()
+        self._revoked_tokens = {t: e for t, e in self._revoked_tokens.items() if e > now}
+        self._revoked_tokens[token] = exp
+        self._claims.pop(token, None)
+
+    def revoke_user(self, user_id: int):
+        # A generation rather than a timestamp, so a token issued right after (even within
+        # the same second) is valid and every earlier one is not
+        self._generations[user_id] = self.generation(user_id) + 1
+        for token in [t for t, (_, user) in self._claims.items() if user['id'] == user_id]:
+            del self._claims[token]
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._claims)}
+
+
+token_cache = TokenCache()
+
+
+def revoke_user_tokens(user_id: int):
+    """Invalidate every token issued so far to a user, e.g. after a role change."""
+    token_cache.revoke_user(user_id)
+
+
+_bcrypt_context = None
+
+
+def get_bcrypt_context():
+    # passlib and its bcrypt backend are imported on the first login or sign-up, not at startup
+    global _bcrypt_context
+    if _bcrypt_context is None:
+        from passlib.context import CryptContext
+        _bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=BCRYPT_ROUNDS)
+    return _bcrypt_context
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, get_bcrypt_context().hash, password)
+
+
+async def verify_password(password: str, hashed_password: str):
+    """Return (valid, new hash or None); the new hash is set when the stored one uses an old cost."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, get_bcrypt_context().verify_and_update, password, hashed_password)
+
+
+class LoginLimiter:
+    def __init__(self, concurrency: int, queue: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._capacity = concurrency + queue
+        self._pending = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._pending >= self._capacity:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts in progress, try again shortly.",
+                headers={"Retry-After": str(LOGIN_RETRY_AFTER)},
+            )
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            self._pending -= 1
+
+
+login_limiter = LoginLimiter(LOGIN_CONCURRENCY, LOGIN_QUEUE)
+
 
 class CreateUserRequest(BaseModel):
     username: str
@@ -43,19 +180,23 @@ class UserResponse(BaseModel):
         orm_mode = True
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 
-@router.post("/user", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/user", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(ratelimit.limit_ip)])
 async def create_user(db: db_dependency, create_user_request: CreateUserRequest):
     create_user_model = Users(
         username=create_user_request.username,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=await hash_password(create_user_request.password),
         role=create_user_request.role
     )
     db.add(create_user_model)
-    db.commit()
-    db.refresh(create_user_model)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Username already registered.")
     user_response = UserResponse(
         id=create_user_model.id,
         username=create_user_model.username,
@@ -65,45 +206,72 @@ async def create_user(db: db_dependency, create_user_request: CreateUserRequest)
     return user_response
 
 
-@router.post("/token", response_model=Token)
+@router.post("/token", response_model=Token, dependencies=[Depends(ratelimit.limit_ip)])
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    async with login_limiter.slot():
+        user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user")
     token = create_access_token(user.username, user.id, user.role, timedelta(minutes=20))
     return {'access_token': token, 'token_type': 'bearer', 'role': user.role}
 
 
-def authenticate_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()
+@router.post("/logout")
+async def logout(token: Annotated[str, Depends(oauth2_bearer)]):
+    await get_current_user(token)
+    claims = jwt.get_unverified_claims(token)
+    token_cache.revoke_token(token, claims.get('exp', float('inf')))
+    return {"message": "Logged out."}
+
+
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = (await db.execute(select(Users).where(Users.username == username))).scalars().first()
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
 def create_access_token(username: str, user_id: int, role: UserRole, expires_delta: timedelta):
-    encode = {'sub': username, 'id': user_id, 'role': role.value}
-    expires = datetime.utcnow() + expires_delta
-    encode.update({'exp': expires})
+    encode = {'sub': username, 'id': user_id, 'role': role.value, 'gen': token_cache.generation(user_id)}
+    issued = datetime.utcnow()
+    expires = issued + expires_delta
+    encode.update({'exp': expires, 'iat': issued})
     return jwt.encode(encode, SECRETE_KEY, algorithm=ALGORITHM)
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    user = _verified_user(token)
+    # Charged once per request: FastAPI caches this dependency within a request
+    await ratelimit.limit_user(user)
+    return user
+
+
+def _verified_user(token: str) -> dict:
+    user = token_cache.get(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRETE_KEY, algorithms=[ALGORITHM])
         username: str = payload.get('sub')
         user_id: int = payload.get('id')
         user_role: str = payload.get('role')
-        if username is None or user_id is None:
+        if username is None or user_id is None or token_cache.is_revoked(token, payload):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user.")
-        return {'username': username, 'id': user_id, 'role': user_role}
+        user = {'username': username, 'id': user_id, 'role': user_role}
+        if 'exp' in payload:
+            token_cache.put(token, payload['exp'], user)
+        return user
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could now validate the user..")
 
 
-def get_current_user_role(current_user: dict = Depends(get_current_user)):
+async def get_current_user_role(current_user: dict = Depends(get_current_user)):
     return UserRole(current_user.get('role'))
 
 
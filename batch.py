@@ -0,0 +1,155 @@
+"""Set-based execution of POST /pokemon/batch.
+
+Operations are validated one by one, then grouped and run as a handful of
+statements in a single transaction: one multi-row INSERT ... RETURNING for
+creates, one UPDATE ... FROM (VALUES ...) RETURNING per set of updated
+columns, and one DELETE ... WHERE id = ANY(...) RETURNING id. Groups run in
+that order (create, update, patch, delete), so an id may only appear once
+among the update/patch/delete operations of a batch.
+"""
+from collections import defaultdict
+
+from pydantic import ValidationError
+from sqlalchemy import Integer, any_, bindparam, column, delete, insert, update, values
+from sqlalchemy.dialects.postgresql import ARRAY
+
+import models
+import stats
+from hooks import pokemon_changed
+from models import UserRole
+from schema import PokemonPatchInputSchema, PokemonPostPutInputSchema
+
+table = models.PokemonData.__table__
+
+# PostgreSQL accepts at most 32767 bind parameters per statement
+MAX_PARAMS = 30000
+
+ADMIN_ONLY_OPS = ("create", "delete")
+SUCCESS_STATUS = {"create": 201, "update": 202, "patch": 200, "delete": 200}
+
+
+def _result(index: int, op: str, pokemon_id, status: int, data=None, error=None) -> dict:
+    return {"index": index, "op": op, "id": pokemon_id, "status": status, "data": data, "error": error}
+
+
+def _validation_message(e: ValidationError) -> str:
+    error = e.errors()[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+async def _update_rows(db, items):
+    """UPDATE every (id, values) pair in `items` (all with the same keys) and return the new rows."""
+    cols = sorted(items[0][1])
+    if db.bind.dialect.name == "postgresql":
+        rows = []
+        chunk = MAX_PARAMS // (len(cols) + 1)
+        for start in range(0, len(items), chunk):
+            new_values = values(
+                column("id", Integer), *[column(c, table.c[c].type) for c in cols], name="new_values"
+            ).data([(pokemon_id, *[data[c] for c in cols]) for pokemon_id, data in items[start:start + chunk]])
+            stmt = (
+                update(table)
+                .where(table.c.id == new_values.c.id)
+                .values({c: new_values.c[c] for c in cols})
+                .returning(table)
+            )
+            rows += (await db.execute(stmt)).mappings().all()
+        return rows
+
+    # SQLite and others: no UPDATE ... FROM (VALUES ...) with column aliases, one statement per row
+    rows = []
+    for pokemon_id, data in items:
+        stmt = update(table).where(table.c.id == pokemon_id).values(data).returning(table)
+        rows += (await db.execute(stmt)).mappings().all()
+    return rows
+
+
+async def _delete_rows(db, ids):
+    if db.bind.dialect.name == "postgresql":
+        condition = table.c.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    else:
+        condition = table.c.id.in_(ids)
+    return (await db.execute(delete(table).where(condition).returning(table.c.id))).scalars().all()
+
+
+async def run_batch(db, operations, role: UserRole):
+    """Validate and execute `operations`; returns one result dict per operation, in order.
+
+    Database errors roll back the whole batch and propagate to the caller.
+    """
+    results = [None] * len(operations)
+    creates = []  # (index, values)
+    updates = defaultdict(list)  # (op, sorted column names) -> [(index, id, values)]
+    deletes = []  # (index, id)
+    claimed_ids = set()
+
+    for index, operation in enumerate(operations):
+        op, pokemon_id = operation.op, operation.id
+        if op in ADMIN_ONLY_OPS and role != UserRole.admin:
+            results[index] = _result(index, op, pokemon_id, 403, error="Operation not permitted...")
+            continue
+        if op != "create":
+            if pokemon_id is None:
+                results[index] = _result(index, op, None, 422, error="id is required.")
+                continue
+            if pokemon_id in claimed_ids:
+                results[index] = _result(index, op, pokemon_id, 409, error="id appears more than once in the batch.")
+                continue
+            claimed_ids.add(pokemon_id)
+
+        try:
+            if op in ("create", "update"):
+                data = PokemonPostPutInputSchema.model_validate(operation.data or {}).model_dump()
+            elif op == "patch":
+                data = PokemonPatchInputSchema.model_validate(operation.data or {}).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            results[index] = _result(index, op, pokemon_id, 422, error=_validation_message(e))
+            continue
+
+        if op == "create":
+            creates.append((index, data))
+        elif op == "delete":
+            deletes.append((index, pokemon_id))
+        elif not data:
+            results[index] = _result(index, op, pokemon_id, 422, error="No fields to update.")
+        else:
+            updates[(op, tuple(sorted(data)))].append((index, pokemon_id, data))
+
+    changed_rows, deleted_ids = [], []  # changed_rows: (row, columns set by an update, or None)
+    old_groups = await stats.summary_keys_for_ids(db, claimed_ids)
+
+    if creates:
+        stmt = insert(table).returning(table, sort_by_parameter_order=True)
+        rows = (await db.execute(stmt, [data for _, data in creates])).mappings().all()
+        for (index, _), row in zip(creates, rows):
+            results[index] = _result(index, "create", row["id"], 201, data=dict(row))
+        changed_rows += [(row, None) for row in rows]
+
+    for (op, cols), items in updates.items():
+        rows = {row["id"]: row for row in await _update_rows(db, [(pokemon_id, data) for _, pokemon_id, data in items])}
+        for index, pokemon_id, _ in items:
+            row = rows.get(pokemon_id)
+            if row is None:
+                results[index] = _result(index, op, pokemon_id, 404, error="Pokemon not found.")
+            else:
+                results[index] = _result(index, op, pokemon_id, SUCCESS_STATUS[op], data=dict(row))
+        changed_rows += [(row, cols) for row in rows.values()]
+
+    if deletes:
+        deleted_ids = set(await _delete_rows(db, [pokemon_id for _, pokemon_id in deletes]))
+        for index, pokemon_id in deletes:
+            if pokemon_id in deleted_ids:
+                results[index] = _result(index, "delete", pokemon_id, 200)
+            else:
+                results[index] = _result(index, "delete", pokemon_id, 404, error="Pokemon not found.")
+
+    await stats.refresh_summary_groups(db, old_groups + [stats.group_key(dict(row)) for row, _ in changed_rows])
+    await db.commit()
+
+    for row, fields in changed_rows:
+        pokemon_changed("upsert", dict(row), fields)
+    for pokemon_id in deleted_ids:
+        pokemon_changed("delete", pokemon_id)
+
+    return results
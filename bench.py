@@ -0,0 +1,317 @@
+"""Offline load and latency benchmark for the API.
+
+Seeds N synthetic pokemon into a scratch database, runs the app in-process
+(no server, no network) with the database dependency overridden the same way
+test.py does, and drives each scenario with a fixed number of requests from
+concurrent clients. Results are printed as JSON: throughput and p50/p95/p99
+latency per scenario, so runs can be diffed between releases.
+
+    python bench.py --rows 100000 --requests 2000 --concurrency 10 --output bench.json
+
+The default database is a SQLite file in a temp directory. `--database-url`
+also accepts a PostgreSQL URL (postgresql+asyncpg://...); its tables are
+DROPPED and recreated, so point it at a scratch database.
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+
+import httpx
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import models
+import ratelimit
+from database import Base, get_db
+from ingest import FIELD_MAP
+from main import app
+
+TYPES = ("Fire", "Water", "Grass", "Electric", "Psychic", "Rock")
+SEED_CHUNK = 10000
+
+USERNAME, PASSWORD = "bench-admin", "bench-password"
+
+# Login verifies a bcrypt hash, so it gets a fraction of the request budget
+LOGIN_REQUEST_SHARE = 10
+
+JOB_POLL_SECONDS = 0.01  # fetch_and_store is a background job, polled until it finishes
+
+
+def synthetic_pokemon(i: int) -> dict:
+    return {
+        "name": f"Pokemon{i:07d}", "type_1": TYPES[i % len(TYPES)], "type_2": None,
+        "total": 300 + i % 300, "hp": 40 + i % 60, "attack": 50 + i % 80, "defense": 40 + i % 70,
+        "sp_atk": 50 + i % 90, "sp_def": 50 + i % 50, "speed": 20 + i % 100,
+        "generation": 1 + i % 6, "legendary": i % 50 == 0,
+    }
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def setup_database(url: str, rows: int):
+    table = models.PokemonData.__table__
+    if url.startswith("sqlite"):
+        # The nextval() default only exists on PostgreSQL
+        table.c.id.server_default = None
+        # Concurrent writers wait for the file lock instead of failing; WAL lets reads proceed meanwhile
+        engine = create_async_engine(url, connect_args={"timeout": 30})
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _wal(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.close()
+    else:
+        engine = create_async_engine(url)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        if engine.dialect.name == "postgresql":
+            await conn.execute(text("CREATE SEQUENCE IF NOT EXISTS pokemon_data_id_seq"))
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(1, rows + 1, SEED_CHUNK):
+            batch = [{"id": i, **synthetic_pokemon(i)} for i in range(start, min(start + SEED_CHUNK, rows + 1))]
+            await conn.execute(insert(table), batch)
+        if engine.dialect.name == "postgresql":
+            await conn.execute(text(f"SELECT setval('pokemon_data_id_seq', {max(rows, 1)})"))
+            await conn.execute(text("ANALYZE pokemon_data"))
+
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def bench_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_db
+    # Every request comes from one user and one address, which the per-client limits would throttle
+    ratelimit.RATE_LIMITS_ENABLED = False
+    return engine
+
+
+def serve_fixture(records: int):
+    """Write a feed of `records` pokemon to a temp dir and serve it over local HTTP; returns its URL."""
+    directory = tempfile.mkdtemp(prefix="pokemon-bench-")
+    feed = []
+    for i in range(records):
+        row = synthetic_pokemon(10_000_000 + i)
+        feed.append({field: row[col] for field, col in FIELD_MAP.items()})
+    with open(os.path.join(directory, "feed.json"), "w") as f:
+        json.dump(feed, f)
+
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/feed.json"
+
+
+class Bench:
+    def __init__(self, client: httpx.AsyncClient, rows: int, requests: int, concurrency: int, seed: int):
+        self.client = client
+        self.rows = rows
+        self.requests = requests
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.created_ids = []
+        self.fixture_url = None
+
+    async def measure(self, name: str, request, requests: int = None, concurrency: int = None) -> dict:
+        """Call `request(i)` for i in range(requests) from `concurrency` workers and summarize the latencies."""
+        requests = requests or self.requests
+        remaining = iter(range(requests))
+        latencies, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            for i in remaining:
+                start = time.perf_counter()
+                response = await request(i)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        print(f"running {name} ({requests} requests)", file=sys.stderr)
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency or self.concurrency)])
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "requests": requests,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(requests / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+
+    def random_id(self) -> int:
+        return self.random.randint(1, self.rows)
+
+    async def login(self):
+        await self.client.post("/auth/user", json={"username": USERNAME, "password": PASSWORD, "role": "admin"})
+        response = await self.client.post("/auth/token", data={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+        self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    # Scenarios, run in the order of SCENARIOS
+
+    async def get_by_id(self):
+        return await self.measure("get_by_id", lambda i: self.client.get(f"/pokemon/{self.random_id()}"))
+
+    async def list_offset(self):
+        return await self.measure("list_offset", lambda i: self.client.get("/pokemon/", params={"limit": 100}))
+
+    async def list_deep_offset(self):
+        last_page = max(1, self.rows // 100)
+        return await self.measure(
+            "list_deep_offset", lambda i: self.client.get("/pokemon/", params={"limit": 100, "page": last_page})
+        )
+
+    async def list_cursor(self):
+        # A keyset page seeks straight to its position, so any later page stands for the deep ones
+        first = await self.client.get("/pokemon/", params={"limit": 1, "col": "name", "paginate": "cursor"})
+        cursor = first.json()["next_cursor"]
+        return await self.measure(
+            "list_cursor", lambda i: self.client.get("/pokemon/", params={"limit": 100, "col": "name", "cursor": cursor})
+        )
+
+    async def list_keyword(self):
+        return await self.measure(
+            "list_keyword",
+            lambda i: self.client.get("/pokemon/", params={"limit": 100, "col": "name", "keyword": f"mon{i % 10:02d}"}),
+        )
+
+    async def list_filter(self):
+        return await self.measure(
+            "list_filter",
+            lambda i: self.client.get("/pokemon/", params={"limit": 100, "filter": "type_1:eq:Fire,attack:gte:100"}),
+        )
+
+    async def create(self):
+        async def request(i):
+            response = await self.client.post("/pokemon", json=synthetic_pokemon(self.rows + 1 + i))
+            if response.status_code == 201:
+                self.created_ids.append(response.json()["id"])
+            return response
+
+        return await self.measure("create", request)
+
+    async def update(self):
+        return await self.measure(
+            "update", lambda i: self.client.put(f"/pokemon/{self.random_id()}", json=synthetic_pokemon(i))
+        )
+
+    async def patch(self):
+        body = {**synthetic_pokemon(0), "speed": 150}
+        return await self.measure("patch", lambda i: self.client.patch(f"/pokemon/{self.random_id()}", json=body))
+
+    async def delete(self):
+        ids = list(self.created_ids)
+        if not ids:
+            return None
+        return await self.measure("delete", lambda i: self.client.delete(f"/pokemon/{ids[i]}"), requests=len(ids))
+
+    async def auth_login(self):
+        return await self.measure(
+            "auth_login",
+            lambda i: self.client.post("/auth/token", data={"username": USERNAME, "password": PASSWORD}),
+            requests=max(1, self.requests // LOGIN_REQUEST_SHARE),
+        )
+
+    async def auth_token(self):
+        return await self.measure("auth_token", lambda i: self.client.get("/test"))
+
+    async def fetch_and_store(self):
+        # Each run ingests the whole fixture: the first one inserts, later ones find the rows unchanged.
+        # The route only queues a job, so each request is timed until its job has finished.
+        async def request(i):
+            response = await self.client.post("/pokemon/fetch_and_store/", params={"url": self.fixture_url})
+            if response.status_code != 202:
+                return response
+            job_url = response.headers["Location"]
+            while True:
+                response = await self.client.get(job_url)
+                if response.status_code != 200 or response.json()["status"] not in ("queued", "running"):
+                    break
+                await asyncio.sleep(JOB_POLL_SECONDS)
+            if response.status_code == 200 and response.json()["status"] != "succeeded":
+                return httpx.Response(500)
+            return response
+
+        return await self.measure("fetch_and_store", request, requests=3, concurrency=1)
+
+
+SCENARIOS = (
+    "get_by_id", "list_offset", "list_deep_offset", "list_cursor", "list_keyword", "list_filter",
+    "create", "update", "patch", "delete", "auth_login", "auth_token", "fetch_and_store",
+)
+
+
+async def main(args):
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='pokemon-bench-')}/bench.db"
+    engine = await setup_database(url, args.rows)
+    # Unhandled errors become 500 responses and count as errors instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            bench = Bench(client, args.rows, args.requests, args.concurrency, args.seed)
+            await bench.login()
+            if "fetch_and_store" in scenarios:
+                bench.fixture_url = serve_fixture(args.fixture_rows)
+            for name in SCENARIOS:
+                if name in scenarios:
+                    result = await getattr(bench, name)()
+                    if result is not None:
+                        results[name] = result
+    finally:
+        await engine.dispose()
+
+    report = {
+        "config": {
+            "database": engine.dialect.name, "rows": args.rows, "requests": args.requests,
+            "concurrency": args.concurrency, "fixture_rows": args.fixture_rows,
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Scratch database (default: a SQLite file in a temp directory)")
+    parser.add_argument("--rows", type=int, default=1000, help="Synthetic pokemon to seed, e.g. 1000, 100000, 1000000")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--fixture-rows", type=int, default=1000, help="Records in the local fetch_and_store feed")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the ids requested")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,201 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import orjson
+from fastapi import Response, status
+
+from hooks import as_row, on_pokemon_change
+from schema import PokemonGetOutputSchema
+
+# Columns of a GET /pokemon/{id} body, in response order
+OUTPUT_COLUMNS = tuple(PokemonGetOutputSchema.model_fields)
+
+CACHE_MAXSIZE = 10000
+CACHE_TTL = 300  # seconds
+LIST_ETAG_TTL = 60  # seconds; bounds how long list ETags can miss writes made by other workers
+GENERATION_SLOTS = 4096  # per-id write counters; ids sharing a slot only cost a skipped fill
+
+
+class CachedEntity(NamedTuple):
+    etag: str
+    body: bytes
+
+
+class CacheBackend:
+    """Storage used by EntityCache. Subclass it to share entries between workers (e.g. Redis)."""
+
+    def get(self, key: str) -> Optional[CachedEntity]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: CachedEntity):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUTTLCache(CacheBackend):
+    """In-process LRU cache whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def encode_entity(row, columns: tuple = OUTPUT_COLUMNS) -> CachedEntity:
+    """Encode `columns` of a row as a JSON body and derive its ETag from the bytes."""
+    body = orjson.dumps({col: row[col] for col in columns})
+    return CachedEntity(etag='"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"', body=body)
+
+
+class EntityCache:
+    """Read-through cache of encoded GET /pokemon/{id} responses.
+
+    Entries hold the JSON body and its ETag, so a hit skips both the database
+    and serialization. The ETag is a digest of the body: it changes exactly when
+    the row does and is the same in every worker.
+
+    A read-through fill takes `generation(id)` before its SELECT and passes it to
+    `put`. Writes bump the id's generation, so a fill whose SELECT raced a write
+    is dropped instead of overwriting the written row with the one read before.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._generations = [0] * GENERATION_SLOTS
+        self._epoch = 0  # bumped by clear()
+
+    @staticmethod
+    def _key(pokemon_id: int) -> str:
+        return f"pokemon:{pokemon_id}"
+
+    def get(self, pokemon_id: int) -> Optional[CachedEntity]:
+        return self.backend.get(self._key(pokemon_id))
+
+    def generation(self, pokemon_id: int) -> tuple:
+        return self._epoch, self._generations[pokemon_id % GENERATION_SLOTS]
+
+    def _touch(self, pokemon_id: int):
+        self._generations[pokemon_id % GENERATION_SLOTS] += 1
+
+    def put(self, pokemon, generation: tuple = None) -> CachedEntity:
+        """Store a row. Without `generation` it is a committed write; with it, a read-through fill."""
+        # Rows come from the database or a committed write, so they are encoded without re-validation
+        row = as_row(pokemon)
+        entry = encode_entity(row)
+        if generation is None:
+            self._touch(row["id"])
+            self.backend.set(self._key(row["id"]), entry)
+        elif generation == self.generation(row["id"]):
+            self.backend.set(self._key(row["id"]), entry)
+        return entry
+
+    def invalidate(self, pokemon_id: int):
+        self._touch(pokemon_id)
+        self.backend.delete(self._key(pokemon_id))
+
+    def clear(self):
+        self._epoch += 1
+        self.backend.clear()
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cached_response(entry: CachedEntity, if_none_match: Optional[str] = None) -> Response:
+    if etag_matches(entry.etag, if_none_match):
+        return not_modified(entry.etag)
+    return Response(content=entry.body, media_type="application/json", headers={"ETag": entry.etag})
+
+
+class TableVersion:
+    """Counter bumped by every write to pokemon_data, the basis of list ETags.
+
+    It is per process: the random epoch keeps ETags from different processes
+    (or restarts) from ever matching each other. A worker does not see the
+    writes handled by the others, so the ETag also changes every LIST_ETAG_TTL
+    seconds (a wall-clock bucket), which bounds how long it can answer 304 for
+    a list another worker has changed, like the TTLs of the other caches.
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self.value = 0
+
+    def bump(self):
+        self.value += 1
+
+    def etag(self, query_params) -> str:
+        """ETag of a list response: the current version plus the request's normalized query parameters."""
+        bucket = int(time.time() // LIST_ETAG_TTL)
+        key = f"{self.epoch}:{self.value}:{bucket}:{sorted(query_params)!r}".encode()
+        return '"' + hashlib.blake2b(key, digest_size=8).hexdigest() + '"'
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def set_backend(backend: CacheBackend):
+    """Swap the storage behind the entity cache, e.g. for a shared cache."""
+    entity_cache.backend = backend
+
+
+entity_cache = EntityCache(LRUTTLCache())
+pokemon_version = TableVersion()
+
+
+@on_pokemon_change
+def _sync_entity_cache(op: str, pokemon, fields):
+    # Refresh on upsert so the next read is a hit; bulk changes drop everything
+    if op == "upsert":
+        entity_cache.put(pokemon)
+    elif op == "delete":
+        entity_cache.invalidate(pokemon)
+    else:
+        entity_cache.clear()
+
+
+@on_pokemon_change
+def _bump_pokemon_version(op: str, pokemon, fields):
+    pokemon_version.bump()
@@ -0,0 +1,130 @@
+"""In-process change feed behind GET /pokemon/changes (SSE) and /pokemon/changes/ws.
+
+Every committed write to pokemon_data becomes one compact event, numbered by
+a per-process sequence:
+
+    {"seq": 42, "op": "update", "id": 7, "fields": ["attack"], "version": 42, ...}
+
+`op` is "create", "update", "delete" or "reload" (a bulk ingest: clients
+should refetch whatever they hold). `version` is the table version behind
+the list ETags, so a client can tell whether a cached list is still current.
+
+Each subscriber has its own bounded queue. A subscriber that falls more than
+SUBSCRIBER_QUEUE_SIZE events behind is not allowed to hold back the writers:
+its backlog is dropped and replaced by a single "resync" event, after which
+it should refetch and carry on. The last CHANGE_HISTORY events are kept so a
+reconnecting client can resume from the last sequence number it saw.
+"""
+import asyncio
+import itertools
+from collections import deque
+from typing import Optional
+
+from cache import pokemon_version
+from hooks import on_pokemon_change
+
+CHANGE_HISTORY = 1000  # events kept for resuming
+SUBSCRIBER_QUEUE_SIZE = 256  # events buffered per subscriber before it is told to resync
+KEEPALIVE_SECONDS = 15  # idle interval after which the SSE stream sends a comment line
+
+FILTER_COLUMNS = ("type_1", "type_2", "generation")
+
+
+class Subscription:
+    def __init__(self, feed, type_: Optional[str], generation: Optional[int]):
+        self.feed = feed
+        self.type = type_.lower() if type_ else None
+        self.generation = generation
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def matches(self, event: dict) -> bool:
+        # Deletes and reloads carry no row, so every subscriber gets them
+        if event["op"] not in ("create", "update"):
+            return True
+        if self.type and self.type not in ((event["type_1"] or "").lower(), (event["type_2"] or "").lower()):
+            return False
+        return self.generation is None or event["generation"] == self.generation
+
+    def offer(self, event: dict):
+        if not self.matches(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog rather than buffer without bound
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.feed.resync_event())
+
+    async def get(self, timeout: float = None) -> Optional[dict]:
+        """The next event, or None if none arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.feed.subscribers.discard(self)
+
+
+class ChangeFeed:
+    def __init__(self, history: int = CHANGE_HISTORY):
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+
+    def publish(self, op: str, pokemon_id=None, fields=None, row: dict = None) -> dict:
+        self.last_seq = next(self._seq)
+        event = {
+            "seq": self.last_seq,
+            "op": op,
+            "id": pokemon_id,
+            "fields": list(fields) if fields is not None else None,
+            "version": pokemon_version.value,
+        }
+        if row is not None:
+            event.update({col: row[col] for col in FILTER_COLUMNS})
+        self.history.append(event)
+        for subscription in list(self.subscribers):
+            subscription.offer(event)
+        return event
+
+    def resync_event(self) -> dict:
+        return {"seq": self.last_seq, "op": "resync", "id": None, "fields": None, "version": pokemon_version.value}
+
+    def subscribe(self, type_: str = None, generation: int = None, last_seq: int = None) -> Subscription:
+        """Register a subscriber, first queueing the events after `last_seq` it missed.
+
+        If those are no longer in the history (or `last_seq` is from another
+        process), the subscriber starts with a "resync" event instead.
+        """
+        subscription = Subscription(self, type_, generation)
+        if last_seq is not None and last_seq < self.last_seq:
+            oldest = self.history[0]["seq"] if self.history else self.last_seq + 1
+            missed = [event for event in self.history if event["seq"] > last_seq]
+            if last_seq < oldest - 1 or len(missed) > SUBSCRIBER_QUEUE_SIZE:
+                subscription.queue.put_nowait(self.resync_event())
+            else:
+                for event in missed:
+                    subscription.offer(event)
+        elif last_seq is not None and last_seq > self.last_seq:
+            subscription.queue.put_nowait(self.resync_event())
+        self.subscribers.add(subscription)
+        return subscription
+
+
+change_feed = ChangeFeed()
+
+
+@on_pokemon_change
+def _publish_change(op: str, pokemon, fields):
+    # Registered after the cache hooks (this module imports cache), so the version is already bumped
+    if op == "upsert":
+        change_feed.publish("create" if fields is None else "update", pokemon["id"], fields, pokemon)
+    elif op == "delete":
+        change_feed.publish("delete", pokemon)
+    else:
+        change_feed.publish("reload")
@@ -0,0 +1,160 @@
+"""Negotiated gzip / brotli response compression.
+
+Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with the best
+encoding the client accepts: brotli when the optional `brotli` package is
+installed, gzip otherwise. Streaming responses (GET /pokemon/export) are
+compressed chunk by chunk as they are sent.
+
+Every response whose encoding could have been negotiated carries
+`Vary: Accept-Encoding` and a weak ETag, compressed or not, 200 or 304: the
+gzip, brotli and identity bodies differ byte for byte, so they must not share
+one strong validator, and a 304 cannot tell which of them the client holds.
+If-None-Match is compared weakly (see cache.etag_matches), so the weakened
+tag still revalidates.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # brotli's higher levels are too slow for on-the-fly compression
+
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+ENCODERS = {"gzip": _Gzip}
+if brotli is not None:
+    ENCODERS = {"br": _Brotli, **ENCODERS}  # listed in order of preference
+
+
+def negotiate(accept_encoding: str):
+    """Pick the preferred encoding the client accepts (q > 0), or None."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    for encoding in ENCODERS:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+        start = None
+        encoder = None  # set once the response is being compressed
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                # Already encoded, or an event stream, whose events must not wait in the compressor's buffer
+                passthrough = any(
+                    (name.lower() == b"content-encoding")
+                    or (name.lower() == b"content-type" and value.startswith(b"text/event-stream"))
+                    for name, value in message.get("headers", [])
+                )
+                if passthrough:
+                    await send(message)
+                elif encoding is None or message["status"] == 304:
+                    # Not compressed here, but another Accept-Encoding would have been
+                    passthrough = True
+                    await send(_uncompressed_start(start))
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                # First body chunk: decide, then send the (possibly rewritten) start message
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(_uncompressed_start(start))
+                    return await send(message)
+                encoder = ENCODERS[encoding]()
+                if not more_body:
+                    # Whole body in one message: compress it all and keep an exact Content-Length
+                    data = encoder.compress(body) + encoder.flush()
+                    await send(_compressed_start(start, encoding, len(data)))
+                    return await send({"type": "http.response.body", "body": data})
+                await send(_compressed_start(start, encoding))
+
+            data = encoder.compress(body)
+            if not more_body:
+                data += encoder.flush()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+
+def _vary_headers(headers: list) -> list:
+    """Add Accept-Encoding to Vary (merging with an existing Vary) and weaken the ETag."""
+    result, vary = [], None
+    for name, value in headers:
+        lower = name.lower()
+        if lower == b"vary":
+            vary = value if vary is None else vary + b", " + value
+            continue
+        if lower == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        result.append((name, value))
+    if vary is None:
+        vary = b"Accept-Encoding"
+    elif b"accept-encoding" not in vary.lower() and vary.strip() != b"*":
+        vary += b", Accept-Encoding"
+    result.append((b"vary", vary))
+    return result
+
+
+def _uncompressed_start(start: dict) -> dict:
+    return {**start, "headers": _vary_headers(start.get("headers", []))}
+
+
+def _compressed_start(start: dict, encoding: str, content_length: int = None) -> dict:
+    headers = [(name, value) for name, value in start.get("headers", []) if name.lower() != b"content-length"]
+    headers = _vary_headers(headers)
+    headers.append((b"content-encoding", encoding.encode()))
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    return {**start, "headers": headers}
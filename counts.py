@@ -0,0 +1,51 @@
+"""Row counts behind the `total` of the GET /pokemon/ page envelope.
+
+Exact counts are cached per filter (shape and values) and dropped by the
+write hooks, so a COUNT runs once per distinct filter between writes. For
+unfiltered requests on PostgreSQL, `count=approximate` reads the planner's
+estimate from pg_class.reltuples instead, which costs nothing whatever the
+table size; it is only as fresh as the last ANALYZE/autovacuum.
+"""
+from functools import lru_cache
+
+from sqlalchemy import func, select, text
+
+import models
+from cache import LRUTTLCache
+from filters import filter_conditions
+from hooks import on_pokemon_change
+
+COUNT_CACHE_MAXSIZE = 1000
+COUNT_CACHE_TTL = 60  # seconds; bounds staleness from writes made by other workers
+
+COUNT_MODES = ("exact", "approximate")
+
+count_cache = LRUTTLCache(maxsize=COUNT_CACHE_MAXSIZE, ttl=COUNT_CACHE_TTL)
+
+_reltuples = text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'pokemon_data'::regclass")
+
+
+@lru_cache(maxsize=256)
+def count_statement(shape: tuple):
+    table = models.PokemonData.__table__
+    return select(func.count()).select_from(table).where(*filter_conditions(shape, table))
+
+
+async def count_pokemon(db, shape: tuple, params: dict, mode: str = "exact") -> int:
+    if mode == "approximate" and not shape and db.bind.dialect.name == "postgresql":
+        estimate = (await db.execute(_reltuples)).scalar()
+        if estimate is not None and estimate >= 0:  # -1 until the table is first analyzed
+            return estimate
+
+    key = repr((shape, sorted(params.items())))
+    total = count_cache.get(key)
+    if total is None:
+        total = (await db.execute(count_statement(shape), params)).scalar_one()
+        count_cache.set(key, total)
+    return total
+
+
+@on_pokemon_change
+def _clear_count_cache(op: str, pokemon, fields):
+    # Any write can move a row in or out of any filter
+    count_cache.clear()
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+
+from sqlalchemy import Boolean, Integer
+
+import models
+
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+columns = list(models.PokemonData.__table__.columns)
+column_names = [c.name for c in columns]
+
+
+async def stream_rows(engine, stmt, params=None):
+    """Yield lists of Core rows from a server-side cursor, EXPORT_BATCH_SIZE at a time.
+
+    The export outlives the request's session (dependencies are closed before a
+    StreamingResponse is sent), so it checks out its own connection from the engine.
+    """
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE), params)
+        async for partition in result.partitions():
+            yield partition
+
+
+async def encode_ndjson(batches):
+    async for rows in batches:
+        yield "".join(json.dumps(dict(zip(column_names, row))) + "\n" for row in rows)
+
+
+async def encode_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column_names)
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+_pyarrow = None
+
+
+def get_pyarrow():
+    """pyarrow, imported on the first Arrow export rather than at startup; None when it is not installed."""
+    global _pyarrow
+    if _pyarrow is None:
+        try:
+            import pyarrow
+        except ImportError:  # Arrow export is optional
+            return None
+        _pyarrow = pyarrow
+    return _pyarrow
+
+
+def arrow_schema(pa):
+    fields = []
+    for column in columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+    return pa.schema(fields)
+
+
+async def encode_arrow(batches):
+    pa = get_pyarrow()
+    schema = arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    yield sink.drain()
+    async for rows in batches:
+        arrays = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "arrow": encode_arrow,
+}
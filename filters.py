@@ -0,0 +1,213 @@
+"""Filter terms for the list endpoints and the cached statements built from them.
+
+`filter=type_1:eq:Fire,attack:gte:100,speed:between:80..120` is parsed into
+(col, op, value) terms, validated against the column types of PokemonData.
+The legacy col/keyword pair becomes one more term. Statements are built with
+bind parameters only, so every request with the same *shape* (columns,
+operators, sort and pagination mode) reuses one prebuilt Select and SQLAlchemy's
+compiled-SQL cache entry; only the parameter values change.
+
+The statements select the output columns as Core rows rather than ORM
+entities: list responses are encoded straight from them. With `fields=`, only
+the requested columns are selected, so narrow reads move, decode and encode
+less data, and can be answered by index-only scans where an index covers them.
+"""
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Boolean, Integer, String, asc, bindparam, desc, inspect, select
+
+import models
+from pagination import seek_condition
+from schema import PokemonGetOutputSchema
+
+MAX_FILTER_TERMS = 10
+STATEMENT_CACHE_SIZE = 256
+
+OPERATORS = ("eq", "ne", "lt", "lte", "gt", "gte", "between", "in", "contains")
+BOOLEAN_OPERATORS = ("eq", "ne")
+
+# Columns returned by the list endpoints, in response order
+OUTPUT_COLUMNS = tuple(PokemonGetOutputSchema.model_fields)
+
+
+def keyword_filter(col: str, keyword: Optional[str]):
+    """Validate a col/keyword pair and return (column type, filter term or None)."""
+    mapper = inspect(models.PokemonData)
+
+    # Verify column exists in the model
+    if col not in mapper.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{col}' does not exist...")
+
+    # Get the column type
+    column_type = mapper.columns[col].type
+    if not keyword:
+        return column_type, None
+
+    # Validate keyword based on the column's data type
+    if isinstance(column_type, Integer) and not keyword.isdigit():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Keyword '{keyword}' is not valid for column '{col}' (expected int)."
+        )
+    elif isinstance(column_type, Boolean) and keyword.lower() not in ["true", "false"]:
+        raise HTTPException(status_code=400,
+                            detail=f"Keyword '{keyword}' is not valid for column '{col}' (expected bool: 'true' or 'false').")
+    elif isinstance(column_type, String) and keyword.isdigit():
+        raise HTTPException(status_code=400,
+                            detail=f"Keyword '{keyword}' is not valid for column '{col}' (expected string).")
+
+    # Perform search based on keyword: substring match on strings, equality otherwise
+    if isinstance(column_type, String):
+        return column_type, (col, "contains", keyword)
+    # asyncpg binds parameters strictly, so pass the column's Python type
+    value = int(keyword) if isinstance(column_type, Integer) else keyword.lower() == "true"
+    return column_type, (col, "eq", value)
+
+
+def parse_fields(fields: Optional[str]) -> tuple:
+    """Validate 'id,name,...' against the output columns; returns them in response order (all when empty).
+
+    Normalizing the order means one prebuilt statement per set of fields, however they are listed.
+    """
+    if not fields:
+        return OUTPUT_COLUMNS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(requested - set(OUTPUT_COLUMNS))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Use any of: {', '.join(OUTPUT_COLUMNS)}.",
+        )
+    if not requested:
+        return OUTPUT_COLUMNS
+    return tuple(col for col in OUTPUT_COLUMNS if col in requested)
+
+
+def _parse_value(col: str, column_type, raw: str):
+    if isinstance(column_type, Boolean):
+        if raw.lower() not in ("true", "false"):
+            raise HTTPException(status_code=400, detail=f"Filter value '{raw}' is not valid for column '{col}' (expected bool).")
+        return raw.lower() == "true"
+    if isinstance(column_type, Integer):
+        try:
+            return int(raw)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Filter value '{raw}' is not valid for column '{col}' (expected int).")
+    return raw
+
+
+def parse_filter(filter: Optional[str]) -> List[tuple]:
+    """Parse 'col:op:value,...' into [(col, op, value)]; between takes 'lo..hi', in takes 'a|b|c'."""
+    if not filter:
+        return []
+    mapper = inspect(models.PokemonData)
+    terms = []
+    for part in filter.split(","):
+        col, op, raw = (part.split(":", 2) + ["", ""])[:3]
+        if col not in mapper.columns:
+            raise HTTPException(status_code=400, detail=f"Column '{col}' does not exist...")
+        if op not in OPERATORS:
+            raise HTTPException(status_code=400, detail=f"Unknown filter operator '{op}'. Use {', '.join(OPERATORS)}.")
+        column_type = mapper.columns[col].type
+        if isinstance(column_type, Boolean) and op not in BOOLEAN_OPERATORS:
+            raise HTTPException(status_code=400, detail=f"Operator '{op}' is not valid for boolean column '{col}'.")
+        if op == "contains" and not isinstance(column_type, String):
+            raise HTTPException(status_code=400, detail=f"Operator 'contains' is only valid for string columns.")
+
+        if op == "between":
+            low, sep, high = raw.partition("..")
+            if not sep:
+                raise HTTPException(status_code=400, detail=f"Filter '{part}' needs a range like 80..120.")
+            value = (_parse_value(col, column_type, low), _parse_value(col, column_type, high))
+        elif op == "in":
+            value = [_parse_value(col, column_type, item) for item in raw.split("|")]
+        else:
+            value = _parse_value(col, column_type, raw)
+        terms.append((col, op, value))
+
+    if len(terms) > MAX_FILTER_TERMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FILTER_TERMS} filter terms are allowed.")
+    return terms
+
+
+def filter_shape(terms) -> tuple:
+    return tuple((col, op) for col, op, _ in terms)
+
+
+def filter_params(terms) -> dict:
+    params = {}
+    for i, (_, op, value) in enumerate(terms):
+        if op == "between":
+            params[f"f{i}"], params[f"f{i}_hi"] = value
+        elif op == "contains":
+            params[f"f{i}"] = f"%{value}%"
+        else:
+            params[f"f{i}"] = value
+    return params
+
+
+def filter_conditions(shape, table=None) -> list:
+    """WHERE conditions for a filter shape, bound to parameters named as in filter_params."""
+    columns = (table if table is not None else models.PokemonData.__table__).c
+    conditions = []
+    for i, (col, op) in enumerate(shape):
+        column = columns[col]
+        param = bindparam(f"f{i}", type_=column.type, expanding=(op == "in"))
+        if op == "eq":
+            conditions.append(column == param)
+        elif op == "ne":
+            conditions.append(column != param)
+        elif op == "lt":
+            conditions.append(column < param)
+        elif op == "lte":
+            conditions.append(column <= param)
+        elif op == "gt":
+            conditions.append(column > param)
+        elif op == "gte":
+            conditions.append(column >= param)
+        elif op == "between":
+            conditions.append(column.between(param, bindparam(f"f{i}_hi", type_=column.type)))
+        elif op == "in":
+            conditions.append(column.in_(param))
+        else:
+            conditions.append(column.ilike(param))
+    return conditions
+
+
+def selected_columns(fields: tuple, col: str, mode: str) -> tuple:
+    """Columns a list query selects: the requested fields, plus the cursor's (col, id) in keyset modes."""
+    if mode == "offset":
+        return fields
+    return tuple(name for name in OUTPUT_COLUMNS if name in fields or name in (col, "id"))
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def list_statement(shape: tuple, col: str, sort: str, mode: str, fields: tuple = OUTPUT_COLUMNS):
+    """Prebuilt GET /pokemon/ query for a request shape.
+
+    mode is 'offset' (binds limit, offset), 'cursor' (first keyset page, binds
+    limit) or 'seek' (later keyset pages, also binds seek_value and seek_id).
+    """
+    table = models.PokemonData.__table__
+    column = table.c[col]
+
+    columns = selected_columns(fields, col, mode)
+    query = select(*[table.c[name] for name in columns]).where(*filter_conditions(shape, table))
+
+    # Sorting, with id as tie-breaker so the order is total and pages are stable
+    order = asc if sort == "asc" else desc
+    query = query.order_by(order(column), order(table.c.id))
+
+    if mode == "seek":
+        query = query.where(
+            seek_condition(
+                column, table.c.id, sort,
+                bindparam("seek_value", type_=column.type), bindparam("seek_id", type_=Integer()),
+            )
+        )
+    query = query.limit(bindparam("limit", type_=Integer()))
+    if mode == "offset":
+        query = query.offset(bindparam("offset", type_=Integer()))
+    return query
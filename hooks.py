@@ -0,0 +1,108 @@
+"""Listeners notified after rows of pokemon_data are written.
+
+Write paths call `pokemon_changed` once their transaction is committed, and
+in-process structures derived from the table (caches, indexes, ...) register
+with `on_pokemon_change` to keep themselves up to date. Operations:
+
+- "upsert": `pokemon` is the row as a dict of column values.
+- "delete": `pokemon` is the deleted id.
+- "reload": many rows changed at once (bulk ingest); `pokemon` is None.
+
+Listeners are called as `listener(op, pokemon, fields)`, where `fields` is the
+tuple of columns an update set, or None when the whole row was written.
+
+`DerivedIndex` is the base of the in-memory structures loaded from the table
+on first use (leaderboards, stat snapshot, search index).
+"""
+import asyncio
+from collections.abc import Mapping
+from typing import Callable, List
+
+import models
+
+_listeners: List[Callable] = []
+
+columns = [c.name for c in models.PokemonData.__table__.columns]
+
+
+def on_pokemon_change(listener: Callable):
+    _listeners.append(listener)
+    return listener
+
+
+def as_row(pokemon) -> dict:
+    if isinstance(pokemon, dict):
+        return pokemon
+    if isinstance(pokemon, Mapping):  # Core row mapping
+        return dict(pokemon)
+    if hasattr(pokemon, "_mapping"):  # Core row
+        return dict(pokemon._mapping)
+    return {c: getattr(pokemon, c) for c in columns}
+
+
+def pokemon_changed(op: str, pokemon=None, fields=None):
+    if op == "upsert":
+        pokemon = as_row(pokemon)
+    for listener in _listeners:
+        listener(op, pokemon, fields)
+
+
+class DerivedIndex:
+    """In-memory structure derived from pokemon_data, loaded on first use and then kept current by the hooks.
+
+    Subclasses implement `load(db)` (select the rows and add them), `add(row)`, `remove(pokemon_id)` and
+    `clear()`, and register `on_change` with `on_pokemon_change`. Writes committed while `load` is running
+    may be missing from its SELECT, so their events are queued and applied once it has finished; a
+    "reload" resets the structure, which is then loaded again on next use.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._build_lock = asyncio.Lock()
+        self._pending = None  # events received during a load, None otherwise
+
+    async def load(self, db):
+        raise NotImplementedError
+
+    def add(self, row: dict):
+        raise NotImplementedError
+
+    def remove(self, pokemon_id: int):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def reset(self):
+        self.clear()
+        self.ready = False
+
+    async def ensure_loaded(self, db):
+        if self.ready:
+            return
+        async with self._build_lock:
+            if self.ready:
+                return
+            self._pending = []
+            try:
+                await self.load(db)
+            except BaseException:
+                self.clear()
+                raise
+            finally:
+                pending, self._pending = self._pending, None
+            self.ready = True
+            for event in pending:
+                self.on_change(*event)
+
+    def on_change(self, op: str, pokemon, fields):
+        if self._pending is not None:
+            self._pending.append((op, pokemon, fields))
+        elif not self.ready:
+            return  # loaded on first use
+        elif op == "upsert":
+            self.add(pokemon)
+        elif op == "delete":
+            self.remove(pokemon)
+        else:
+            self.reset()
@@ -0,0 +1,285 @@
+"""Streaming, idempotent ingest of the pokemon feed into pokemon_data.
+
+The feed is read and parsed incrementally, validated and transformed in
+batches, and each batch is merged on `name`: rows that already exist are
+updated (only when something changed), new ones are inserted. Re-running an
+ingest therefore never creates duplicates. The merge takes a transaction-level
+advisory lock on PostgreSQL, so concurrent ingests (two API jobs, or the CLI
+next to one) merge one batch at a time instead of inserting the same new name
+twice.
+
+Usage:
+    python ingest.py [URL | path/to/file.json | -]
+"""
+import asyncio
+import json
+import sys
+import time
+
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, delete, exists, func, insert, or_, select, text, update
+from starlette.concurrency import run_in_threadpool
+
+import models
+import stats as stats_module
+
+SOURCE_URL = "https://coralvanda.github.io/pokemon_data.json"
+FETCH_TIMEOUT = (5, 60)  # (connect, read) seconds
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+MERGE_LOCK_NAME = "pokemon_data:ingest"  # advisory lock key (hashed) serializing the merges
+
+# Feed field -> pokemon_data column
+FIELD_MAP = {
+    "Name": "name",
+    "Type 1": "type_1",
+    "Type 2": "type_2",
+    "Total": "total",
+    "HP": "hp",
+    "Attack": "attack",
+    "Defense": "defense",
+    "Sp. Atk": "sp_atk",
+    "Sp. Def": "sp_def",
+    "Speed": "speed",
+    "Generation": "generation",
+    "Legendary": "legendary",
+}
+
+pokemon_table = models.PokemonData.__table__
+data_columns = [c.name for c in pokemon_table.columns if c.name != "id"]
+
+# Per-connection staging table each batch is loaded into before being merged
+staging_table = Table(
+    "pokemon_ingest_staging",
+    MetaData(),
+    *[Column(c.name, c.type, nullable=c.nullable) for c in pokemon_table.columns if c.name != "id"],
+    prefixes=["TEMPORARY"],
+)
+
+
+class IngestSourceError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def open_source(source: str):
+    """Return an iterator of text chunks from a URL, a local file or stdin ('-')."""
+    if source == "-":
+        return iter(lambda: sys.stdin.read(CHUNK_SIZE), "")
+
+    if source.startswith(("http://", "https://")):
+        import requests  # imported on first use, keeping it out of the API's startup
+
+        try:
+            response = requests.get(source, stream=True, timeout=FETCH_TIMEOUT)
+        except requests.RequestException as e:
+            raise IngestSourceError(502, f"Failed to fetch data: {e}")
+        if response.status_code != 200:
+            response.close()
+            raise IngestSourceError(response.status_code, "Failed to fetch data.")
+        response.encoding = response.encoding or "utf-8"
+        return _closing(response.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True), response)
+
+    try:
+        file = open(source, encoding="utf-8")
+    except OSError as e:
+        raise IngestSourceError(400, f"Cannot open source: {e}")
+    return _closing(iter(lambda: file.read(CHUNK_SIZE), ""), file)
+
+
+def _closing(chunks, resource):
+    try:
+        yield from chunks
+    finally:
+        resource.close()
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            # skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array.")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            yield item
+            pos = end
+    if started:
+        raise ValueError("Unexpected end of JSON array.")
+    raise ValueError("Expected a JSON array.")
+
+
+def transform(record: dict) -> dict:
+    """Map one feed record to a pokemon_data row, raising ValueError when it is invalid."""
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    row = {}
+    for field, col in FIELD_MAP.items():
+        value = record.get(field)
+        column = pokemon_table.columns[col]
+        if value in (None, "") and column.nullable:
+            row[col] = None
+            continue
+        if value is None:
+            raise ValueError(f"missing '{field}'")
+        if isinstance(column.type, Boolean):
+            if isinstance(value, str) and value.lower() in ("true", "false"):
+                value = value.lower() == "true"
+            elif not isinstance(value, bool):
+                raise ValueError(f"'{field}' is not a boolean")
+        elif isinstance(column.type, Integer):
+            if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+                raise ValueError(f"'{field}' is not an integer")
+            value = int(value)
+        elif isinstance(column.type, String):
+            value = str(value)
+            if column.type.length and len(value) > column.type.length:
+                raise ValueError(f"'{field}' is longer than {column.type.length} characters")
+        row[col] = value
+    return row
+
+
+def iter_batches(records, batch_size: int):
+    """Group records into (rows, errors) batches. Rows are de-duplicated by name, last one wins."""
+    rows, errors, seen = {}, [], 0
+    for record in records:
+        seen += 1
+        try:
+            row = transform(record)
+        except ValueError as e:
+            errors.append({"record": seen, "error": str(e)})
+        else:
+            rows[row["name"]] = row
+        if len(rows) + len(errors) >= batch_size:
+            yield list(rows.values()), errors
+            rows, errors = {}, []
+    if rows or errors:
+        yield list(rows.values()), errors
+
+
+async def prepare_staging(conn):
+    await conn.execute(text(f"DROP TABLE IF EXISTS {staging_table.name}"))
+    await conn.run_sync(staging_table.create)
+    await conn.commit()
+
+
+async def load_batch(conn, rows):
+    """Merge one batch into pokemon_data inside the current transaction. Returns (inserted, updated)."""
+    await conn.execute(delete(staging_table))
+
+    if conn.dialect.driver == "asyncpg":
+        # COPY into the staging table
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            staging_table.name,
+            records=[tuple(row[c] for c in data_columns) for row in rows],
+            columns=data_columns,
+        )
+    else:
+        await conn.execute(insert(staging_table), rows)
+
+    if conn.dialect.name == "postgresql":
+        # name has no unique constraint, so two merges running at once would both see a new name
+        # as missing and both insert it. Held until the batch commits. (SQLite has one writer anyway.)
+        await conn.execute(select(func.pg_advisory_xact_lock(func.hashtext(MERGE_LOCK_NAME))))
+
+    # Update rows that exist and differ, then insert the ones that don't exist yet
+    changed = or_(*[pokemon_table.c[c].is_distinct_from(staging_table.c[c]) for c in data_columns if c != "name"])
+    updated = await conn.execute(
+        update(pokemon_table)
+        .where(pokemon_table.c.name == staging_table.c.name)
+        .where(changed)
+        .values({c: staging_table.c[c] for c in data_columns if c != "name"})
+    )
+    inserted = await conn.execute(
+        insert(pokemon_table).from_select(
+            data_columns,
+            select(*[staging_table.c[c] for c in data_columns]).where(
+                ~exists().where(pokemon_table.c.name == staging_table.c.name)
+            ),
+        )
+    )
+    return inserted.rowcount, updated.rowcount
+
+
+async def ingest(engine, source: str = SOURCE_URL, batch_size: int = BATCH_SIZE, progress=None):
+    """Run the whole pipeline, committing batch by batch. Returns the run's counters.
+
+    Reading and parsing are blocking, so each batch is pulled in the threadpool.
+    `progress` is called with the counters after every batch.
+    """
+    stats = {"batches": 0, "received": 0, "inserted": 0, "updated": 0, "unchanged": 0, "rejected": 0, "errors": []}
+    started = time.monotonic()
+
+    chunks = await run_in_threadpool(open_source, source)
+    batches = iter_batches(iter_json_array(chunks), batch_size)
+
+    async with engine.connect() as conn:
+        await prepare_staging(conn)
+        while True:
+            try:
+                batch = await run_in_threadpool(next, batches, None)
+            except ValueError as e:
+                raise IngestSourceError(422, f"Invalid source data: {e}")
+            if batch is None:
+                break
+            rows, errors = batch
+
+            inserted = updated = 0
+            if rows:
+                inserted, updated = await load_batch(conn, rows)
+            await conn.commit()
+
+            stats["batches"] += 1
+            stats["received"] += len(rows) + len(errors)
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            stats["unchanged"] += max(len(rows) - inserted - updated, 0)
+            stats["rejected"] += len(errors)
+            stats["errors"].extend(errors[: 100 - len(stats["errors"])])  # keep the report bounded
+            stats["seconds"] = round(time.monotonic() - started, 3)
+            if progress:
+                progress(stats)
+
+        # Bulk loads recompute the whole summary table in one statement
+        await stats_module.rebuild_summary(conn)
+
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def _print_progress(stats):
+    print(
+        f"batch {stats['batches']}: received={stats['received']} inserted={stats['inserted']} "
+        f"updated={stats['updated']} unchanged={stats['unchanged']} rejected={stats['rejected']} "
+        f"({stats['seconds']}s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    from database import async_engine
+
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE_URL
+    result = asyncio.run(ingest(async_engine, source, progress=_print_progress))
+    print(json.dumps(result, indent=2))
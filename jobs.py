@@ -0,0 +1,149 @@
+"""In-process background jobs, behind POST /pokemon/fetch_and_store/ and /pokemon/jobs.
+
+A submitted job runs as an asyncio task in this process; at most JOB_WORKERS
+run at once and the rest wait their turn in submission order. Submitting a
+job identical to one that is still queued or running (same kind and
+parameters) returns that job instead of starting a second one. The last
+JOB_HISTORY finished jobs are kept so their outcome can be looked up.
+
+Nothing is persisted: jobs do not survive a restart and each worker process
+has its own runner.
+"""
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+
+JOB_WORKERS = 2  # jobs running at once
+MAX_PENDING_JOBS = 20  # queued + running; more are refused with 503
+JOB_HISTORY = 100  # finished jobs kept for GET /pokemon/jobs/{job_id}
+JOBS_RETRY_AFTER = 30  # seconds, when MAX_PENDING_JOBS is reached
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+CANCEL_WAIT_SECONDS = 5  # how long DELETE waits for a cancelled job to stop
+
+
+def job_key(kind: str, params: dict) -> tuple:
+    return kind, tuple(sorted(params.items()))
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+        self.id = secrets.token_hex(8)
+        self.kind = kind
+        self.params = params
+        self.key = job_key(kind, params)
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}  # latest counters reported by the job
+        self.error = None
+        self.task = None
+        self._started = self._finished = None  # monotonic, for the throughput
+
+    def report(self, progress: dict):
+        """Progress callback handed to the job's function."""
+        self.progress = progress
+
+    def as_dict(self) -> dict:
+        rows = self.progress.get("received", 0)
+        rows_per_second = None
+        if self._started is not None:
+            elapsed = (self._finished or time.monotonic()) - self._started
+            rows_per_second = round(rows / elapsed, 1) if elapsed > 0 else None
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "rows_processed": rows,
+            "rows_per_second": rows_per_second,
+            "progress": self.progress,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = MAX_PENDING_JOBS, history: int = JOB_HISTORY):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.history = history
+        self.jobs = OrderedDict()  # id -> Job, oldest first
+        self._active = {}  # key -> queued or running Job
+        self._slots = None
+
+    def submit(self, kind: str, params: dict, run):
+        """Start `await run(job)` in the background; returns (job, created).
+
+        `created` is False when an identical job was already queued or running.
+        """
+        key = job_key(kind, params)
+        existing = self._active.get(key)
+        if existing is not None:
+            return existing, False
+        if len(self._active) >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many jobs in progress, try again later.",
+                headers={"Retry-After": str(JOBS_RETRY_AFTER)},
+            )
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        job = Job(kind, params)
+        self.jobs[job.id] = job
+        self._active[key] = job
+        job.task = asyncio.get_running_loop().create_task(self._run(job, run))
+        return job, True
+
+    async def _run(self, job: Job, run):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.started_at = datetime.now(timezone.utc)
+                job._started = time.monotonic()
+                result = await run(job)
+                if isinstance(result, dict):
+                    job.progress = result
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            job._finished = time.monotonic()
+            self._active.pop(job.key, None)
+            self._trim()
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+        return job
+
+    async def cancel(self, job_id: str) -> Job:
+        """Cancel a queued or running job. Work it has already committed stays committed."""
+        job = self.get(job_id)
+        if job.status in FINISHED_STATUSES:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job already {job.status}.")
+        job.task.cancel()
+        await asyncio.wait([job.task], timeout=CANCEL_WAIT_SECONDS)
+        return job
+
+
+job_runner = JobRunner()
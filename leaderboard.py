@@ -0,0 +1,85 @@
+"""In-memory top-K leaderboards per stat column, behind GET /pokemon/leaderboard/{stat}.
+
+For every stat in STAT_COLUMNS the rows are kept in sorted lists: one for the
+whole table and one per type_1, per generation and per (type_1, generation).
+Entries are (-value, id), so each list reads best first with ties broken by
+id, and a top-k read is a slice of its first k entries, with no database
+access. Writes update the lists through the write hooks, with a bisect and a
+list insert or delete per list. Loaded at startup or on first use.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy import select
+
+import models
+from hooks import DerivedIndex, on_pokemon_change
+from models import STAT_COLUMNS
+
+LEADERBOARD_COLUMNS = ("id", "name", "type_1", "type_2", "generation", *STAT_COLUMNS)
+ENTRY_COLUMNS = ("id", "name", "type_1", "type_2", "generation")
+
+
+def partitions(row) -> tuple:
+    """The (type_1, generation) partitions a row is ranked in; None means any."""
+    type_1, generation = row["type_1"].lower(), row["generation"]
+    return (None, None), (type_1, None), (None, generation), (type_1, generation)
+
+
+class Leaderboards(DerivedIndex):
+    """Row values by id, plus a sorted [(-value, id)] list per (stat, type_1, generation)."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = {}
+        self.boards = defaultdict(list)
+
+    def add(self, row):
+        self.remove(row["id"])
+        row = {col: row[col] for col in LEADERBOARD_COLUMNS}
+        self.rows[row["id"]] = row
+        for type_1, generation in partitions(row):
+            for stat in STAT_COLUMNS:
+                insort(self.boards[(stat, type_1, generation)], (-row[stat], row["id"]))
+
+    def remove(self, pokemon_id: int):
+        row = self.rows.pop(pokemon_id, None)
+        if row is None:
+            return
+        for type_1, generation in partitions(row):
+            for stat in STAT_COLUMNS:
+                key = (stat, type_1, generation)
+                board, entry = self.boards[key], (-row[stat], pokemon_id)
+                position = bisect_left(board, entry)
+                if position < len(board) and board[position] == entry:
+                    del board[position]
+                if not board:
+                    del self.boards[key]
+
+    def clear(self):
+        self.rows.clear()
+        self.boards.clear()
+
+    async def load(self, db):
+        table = models.PokemonData.__table__
+        result = await db.execute(select(*[table.c[col] for col in LEADERBOARD_COLUMNS]))
+        # Append everything, then sort each list once, instead of one insort per row
+        for row in result.mappings():
+            row = dict(row)
+            self.rows[row["id"]] = row
+            for type_1, generation in partitions(row):
+                for stat in STAT_COLUMNS:
+                    self.boards[(stat, type_1, generation)].append((-row[stat], row["id"]))
+        for board in self.boards.values():
+            board.sort()
+
+    def top(self, stat: str, k: int, type_1: str = None, generation: int = None) -> list:
+        board = self.boards.get((stat, type_1.lower() if type_1 else None, generation), ())
+        return [
+            {"rank": rank, **{col: self.rows[pokemon_id][col] for col in ENTRY_COLUMNS}, "value": -negated}
+            for rank, (negated, pokemon_id) in enumerate(board[:k], start=1)
+        ]
+
+
+leaderboards = Leaderboards()
+on_pokemon_change(leaderboards.on_change)
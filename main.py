@@ -1,24 +1,63 @@
-from typing import Optional, List, Annotated
-from fastapi import FastAPI, status, HTTPException, Query, Depends
+import asyncio
+from typing import Optional, List, Annotated, Union
+import orjson
+from fastapi import FastAPI, status, HTTPException, Query, Depends, Header, Request, Response, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field
-import requests
-from sqlalchemy import asc, desc, func, inspect, Integer, Boolean, String
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 import auth
+import batch
+import changes
+import compression
+import counts
+import export
+import filters
+import ingest
+import jobs
+import leaderboard
+import metrics
+import ratelimit
+import search
+import snapshot
+import startup
+import statements
+import stats
 from auth import get_current_user, RoleChecker
-from database import get_db
+from cache import entity_cache, cached_response, encode_entity, etag_matches, not_modified, pokemon_version
+from hooks import pokemon_changed
+from replicas import get_read_db, get_write_db
 import models
+from pagination import encode_cursor, decode_cursor
 from schema import (
     PokemonPostPutInputSchema,
     PokemonPatchInputSchema,
     PokemonGetOutputSchema,
     PokemonPostPatchPutOutputSchema,
+    PokemonCursorPageSchema,
+    PokemonPageSchema,
+    PokemonLeaderboardSchema,
+    PokemonSearchResultSchema,
+    PokemonBatchInputSchema,
+    PokemonBatchOutputSchema,
+    PokemonSimilarInputSchema,
+    PokemonSimilarOutputSchema,
+    PokemonSimilarBatchOutputSchema,
+    JobSchema,
+    JobSubmittedSchema,
     DeleteResponse,
 )
 from models import UserRole
 
-app = FastAPI()
+# orjson encodes responses several times faster than the stdlib json module
+# The lifespan bootstraps the schema and warms the pool and caches; see startup.py and GET /ready
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=startup.lifespan)
 app.include_router(auth.router)
+# The last middleware added runs first: metrics also see the requests that admission control sheds
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(ratelimit.AdmissionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 # Define role-based access control
@@ -26,22 +65,266 @@ admin_only = RoleChecker([UserRole.admin])
 admin_or_moderator = RoleChecker([UserRole.admin, UserRole.moderator])
 all_users = RoleChecker([UserRole.admin, UserRole.moderator, UserRole.user])
 
+
 @app.get("/test", status_code=200)
-def get_info(user: user_dependency):
+async def get_info(user: user_dependency):
     return {"message": "Server is running"}
 
 
+@app.get("/ready", include_in_schema=False)
+async def get_ready():
+    # Readiness probe for the load balancer: 503 until warm-up has finished; no token required
+    if not startup.readiness.ready:
+        return ORJSONResponse({"status": startup.readiness.detail}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    # Prometheus text exposition format; scraped without a token
+    return metrics.render()
+
+
+# Declared before /pokemon/{pokemon_id} so "export" is not parsed as an id
+@app.get("/pokemon/export", dependencies=[Depends(all_users)])
+async def export_pokemon(
+        user: user_dependency,
+        format: str = Query("ndjson", description="Export format: 'ndjson', 'csv' or 'arrow'"),
+        keyword: Optional[str] = Query(None, description="Search keyword"),
+        col: str = Query("name", description="Column to search in, default 'name'"),
+        filter: Optional[str] = Query(None, description="Filter terms, e.g. 'type_1:eq:Fire,attack:gte:100'"),
+        db: AsyncSession = Depends(get_read_db)
+):
+    if format not in export.ENCODERS:
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'ndjson', 'csv' or 'arrow'.")
+    if format == "arrow" and export.get_pyarrow() is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Arrow export requires pyarrow.")
+
+    terms = filters.parse_filter(filter)
+    _, keyword_term = filters.keyword_filter(col, keyword)
+    if keyword_term:
+        terms.insert(0, keyword_term)
+
+    # Core select over the table: rows are encoded as-is, without ORM objects or schema validation
+    table = models.PokemonData.__table__
+    query = select(table).where(*filters.filter_conditions(filters.filter_shape(terms))).order_by(table.c.id)
+
+    batches = export.stream_rows(db.bind, query, filters.filter_params(terms))
+    return StreamingResponse(
+        export.ENCODERS[format](batches),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="pokemon.{format}"'},
+    )
+
+
+def _sse_frame(event: dict) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event["seq"], event["op"].encode(), orjson.dumps(event))
+
+
+def _resume_seq(last_seq: Optional[int], last_event_id: Optional[str]) -> Optional[int]:
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    if last_seq is not None:
+        return last_seq
+    if last_event_id and last_event_id.isdigit():
+        return int(last_event_id)
+    return None
+
+
+@app.get("/pokemon/changes", dependencies=[Depends(all_users)])
+async def pokemon_changes(
+        user: user_dependency,
+        type: Optional[str] = Query(None, description="Only changes to pokemon of this type (type_1 or type_2)"),
+        generation: Optional[int] = Query(None, description="Only changes to pokemon of this generation"),
+        last_seq: Optional[int] = Query(None, description="Resume after this sequence number"),
+        last_event_id: Optional[str] = Header(None),
+):
+    subscription = changes.change_feed.subscribe(type, generation, _resume_seq(last_seq, last_event_id))
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                event = await subscription.get(timeout=changes.KEEPALIVE_SECONDS)
+                # A comment line keeps proxies from closing an idle connection
+                yield b": keepalive\n\n" if event is None else _sse_frame(event)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/pokemon/changes/ws")
+async def pokemon_changes_ws(
+        websocket: WebSocket,
+        token: Optional[str] = Query(None),
+        type: Optional[str] = Query(None),
+        generation: Optional[int] = Query(None),
+        last_seq: Optional[int] = Query(None),
+):
+    # Browsers cannot set headers on a WebSocket, so the token may also come as ?token=
+    authorization = websocket.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    try:
+        await get_current_user(token or "")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = changes.change_feed.subscribe(type, generation, last_seq)
+    # Incoming messages are ignored; the receiver is only there to notice the client going away
+    receiver = asyncio.ensure_future(websocket.receive())
+    getter = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+            if getter.done():
+                await websocket.send_text(orjson.dumps(getter.result()).decode())
+                getter = asyncio.ensure_future(subscription.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        getter.cancel()
+        subscription.close()
+
+
+@app.get(
+    "/pokemon/search",
+    response_model=List[PokemonSearchResultSchema],
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(all_users)]
+)
+async def search_pokemon(
+        user: user_dependency,
+        q: str = Query(..., min_length=1, max_length=40, description="Text to look for in name, type_1 and type_2"),
+        limit: int = Query(10, description="Results to return, default 10", ge=1, le=100),
+        db: AsyncSession = Depends(get_read_db)
+):
+    results = await search.search_pokemon(db, q, limit)
+    return [{**row, "score": round(score, 4)} for row, score in results]
+
+
+@app.get("/pokemon/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(all_users)])
+async def get_pokemon_stats(
+        user: user_dependency,
+        group_by: str = Query("", description="Comma-separated columns: type_1, type_2, generation, legendary"),
+        metrics: str = Query("count", description="Comma-separated metrics, e.g. 'count,avg:attack,p95:speed'"),
+        db: AsyncSession = Depends(get_read_db)
+):
+    return await stats.get_stats(db, group_by, metrics)
+
+
+@app.get(
+    "/pokemon/leaderboard/{stat}",
+    response_model=PokemonLeaderboardSchema,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(all_users)]
+)
+async def get_pokemon_leaderboard(
+        stat: str,
+        user: user_dependency,
+        k: int = Query(50, description="Entries to return, default 50", ge=1, le=100),
+        type_1: Optional[str] = Query(None, description="Only rank pokemon of this primary type"),
+        generation: Optional[int] = Query(None, description="Only rank pokemon of this generation"),
+        db: AsyncSession = Depends(get_read_db)
+):
+    if stat not in models.STAT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Invalid stat. Use one of: {', '.join(models.STAT_COLUMNS)}.")
+    # Read from the in-memory sorted lists; the database is only read to load them once
+    await leaderboard.leaderboards.ensure_loaded(db)
+    items = leaderboard.leaderboards.top(stat, k, type_1, generation)
+    return {"stat": stat, "type_1": type_1, "generation": generation, "items": items}
+
+
 @app.get(
     "/pokemon/{pokemon_id}",
     response_model=PokemonGetOutputSchema,
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(all_users)]
 )
-def get_pokemon_by_id(pokemon_id: int, user: user_dependency, db: Session = Depends(get_db)):
-    pokemon = db.query(models.PokemonData).filter(models.PokemonData.id == pokemon_id).first()
-    if not pokemon:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pokemon not found.")
-    return pokemon
+async def get_pokemon_by_id(
+        pokemon_id: int,
+        user: user_dependency,
+        request: Request,
+        fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. 'id,name,type_1' (default: all)"),
+        db: AsyncSession = Depends(get_read_db)
+):
+    columns = filters.parse_fields(fields)
+    # Read-through: hot ids are answered from the cache, already encoded
+    entry = entity_cache.get(pokemon_id)
+    if columns != filters.OUTPUT_COLUMNS:
+        # Subset of a cached row, or a SELECT of just those columns (not cached: the cache holds whole rows)
+        if entry is not None:
+            row = orjson.loads(entry.body)
+        else:
+            row = (await db.execute(statements.by_id_fields(columns), {"pokemon_id": pokemon_id})).mappings().first()
+            if not row:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pokemon not found.")
+        return cached_response(encode_entity(row, columns), request.headers.get("if-none-match"))
+    if entry is None:
+        # Taken before the SELECT: if a write lands while it runs, the row read is not cached
+        generation = entity_cache.generation(pokemon_id)
+        pokemon = (await db.execute(statements.by_id, {"pokemon_id": pokemon_id})).mappings().first()
+        if not pokemon:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pokemon not found.")
+        entry = entity_cache.put(pokemon, generation)
+    return cached_response(entry, request.headers.get("if-none-match"))
+
+
+def _similar_results(pokemon_ids, k: int, metric: str):
+    if metric not in snapshot.METRICS:
+        raise HTTPException(status_code=400, detail="Invalid metric. Use 'euclidean' or 'cosine'.")
+    missing = snapshot.stat_snapshot.missing(pokemon_ids)
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Pokemon not found: {missing}.")
+    neighbours = snapshot.stat_snapshot.nearest(pokemon_ids, k, metric)
+    return [
+        {
+            "id": pokemon_id,
+            "metric": metric,
+            "similar": [{"id": other, "name": name, "distance": distance} for other, name, distance in rows],
+        }
+        for pokemon_id, rows in zip(pokemon_ids, neighbours)
+    ]
+
+
+@app.get(
+    "/pokemon/{pokemon_id}/similar",
+    response_model=PokemonSimilarOutputSchema,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(all_users)]
+)
+async def get_similar_pokemon(
+        pokemon_id: int,
+        user: user_dependency,
+        k: int = Query(20, description="Number of neighbours, default 20", ge=1, le=100),
+        metric: str = Query("euclidean", description="Distance over the stat vector: 'euclidean' or 'cosine'"),
+        db: AsyncSession = Depends(get_read_db)
+):
+    # Answered from the in-memory stat snapshot; the database is only read to load it once
+    await snapshot.stat_snapshot.ensure_loaded(db)
+    return _similar_results([pokemon_id], k, metric)[0]
+
+
+@app.post(
+    "/pokemon/similar",
+    response_model=PokemonSimilarBatchOutputSchema,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(all_users)]
+)
+async def get_similar_pokemon_batch(body: PokemonSimilarInputSchema, user: user_dependency, db: AsyncSession = Depends(get_read_db)):
+    await snapshot.stat_snapshot.ensure_loaded(db)
+    return {"results": _similar_results(body.ids, body.k, body.metric)}
 
 
 @app.post(
@@ -50,11 +333,27 @@ def get_pokemon_by_id(pokemon_id: int, user: user_dependency, db: Session = Depe
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(admin_only)]
 )
-def add_pokemon(pokemon: PokemonPostPutInputSchema, user: user_dependency, db: Session = Depends(get_db)):
-    new_pokemon = models.PokemonData(**pokemon.dict())
-    db.add(new_pokemon)
-    db.commit()
-    return new_pokemon
+async def add_pokemon(pokemon: PokemonPostPutInputSchema, user: user_dependency, db: AsyncSession = Depends(get_write_db)):
+    new_pokemon = (await db.execute(statements.insert_returning, pokemon.dict())).mappings().one()
+    await stats.refresh_summary_groups(db, [stats.group_key(dict(new_pokemon))])
+    await db.commit()
+    pokemon_changed("upsert", new_pokemon)
+    return dict(new_pokemon)
+
+
+async def _update_returning(db: AsyncSession, pokemon_id: int, values: dict):
+    """UPDATE one row and return its new values, or None if it does not exist.
+
+    One round trip; only with the stats summary enabled is the row's old group read first.
+    """
+    old_groups = await stats.summary_keys_for_ids(db, [pokemon_id])
+    stmt = statements.update_returning if values else statements.by_id
+    row = (await db.execute(stmt, {**values, "pokemon_id": pokemon_id})).mappings().first()
+    if row is not None:
+        await stats.refresh_summary_groups(db, old_groups + [stats.group_key(dict(row))])
+        await db.commit()
+        pokemon_changed("upsert", row, tuple(values))
+    return row
 
 
 @app.put(
@@ -63,148 +362,201 @@ def add_pokemon(pokemon: PokemonPostPutInputSchema, user: user_dependency, db: S
     status_code=status.HTTP_202_ACCEPTED,
     dependencies=[Depends(admin_or_moderator)]
 )
-def update_pokemon(pokemon_id: int, pokemon: PokemonPostPutInputSchema, user: user_dependency, db: Session = Depends(get_db)):
-    existing_pokemon = db.query(models.PokemonData).filter(models.PokemonData.id == pokemon_id).first()
+async def update_pokemon(pokemon_id: int, pokemon: PokemonPostPutInputSchema, user: user_dependency, db: AsyncSession = Depends(get_write_db)):
+    existing_pokemon = await _update_returning(db, pokemon_id, pokemon.dict())
     if not existing_pokemon:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pokemon not found.")
-
-    for key, value in pokemon.dict().items():
-        setattr(existing_pokemon, key, value)
-
-    db.commit()
-    db.refresh(existing_pokemon)
-    return existing_pokemon
+    return dict(existing_pokemon)
 
 @app.patch(
     "/pokemon/{pokemon_id}",
     response_model=PokemonPostPatchPutOutputSchema,
     dependencies=[Depends(admin_or_moderator)]
 )
-def update_pokemon_patch(pokemon_id: int, pokemon: PokemonPatchInputSchema, user: user_dependency, db: Session = Depends(get_db)):
-    existing_pokemon = db.query(models.PokemonData).filter(models.PokemonData.id == pokemon_id).first()
+async def update_pokemon_patch(pokemon_id: int, pokemon: PokemonPatchInputSchema, user: user_dependency, db: AsyncSession = Depends(get_write_db)):
+    existing_pokemon = await _update_returning(db, pokemon_id, pokemon.dict(exclude_unset=True))
     if not existing_pokemon:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Pokemon with id {pokemon_id} doesn't exist.")
-
-    for key, value in pokemon.dict(exclude_unset=True).items():
-        setattr(existing_pokemon, key, value)
-
-    db.commit()
-    db.refresh(existing_pokemon)
-    return existing_pokemon
+    return dict(existing_pokemon)
 
 
 @app.delete( "/pokemon/{pokemon_id}", response_model=DeleteResponse, status_code=200, dependencies=[Depends(admin_only)])
-def delete_pokemon(pokemon_id: int, user: user_dependency, db: Session = Depends(get_db)):
+async def delete_pokemon(pokemon_id: int, user: user_dependency, db: AsyncSession = Depends(get_write_db)):
     if not isinstance(pokemon_id, int):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Pokemon ID must be a valid integer.",
         )
 
-    existing_pokemon = db.query(models.PokemonData).filter(models.PokemonData.id == pokemon_id).first()
-    if not existing_pokemon:
+    # RETURNING hands back the deleted row's summary group, so no SELECT is needed first
+    deleted = (await db.execute(statements.delete_returning, {"pokemon_id": pokemon_id})).first()
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pokemon not found.")
 
-    db.delete(existing_pokemon)
-    db.commit()
+    await stats.refresh_summary_groups(db, [tuple(deleted)])
+    await db.commit()
+    pokemon_changed("delete", pokemon_id)
     return {"message": "Pokemon deleted successfully."}
 
 
-@app.post("/pokemon/fetch_and_store/", dependencies=[Depends(admin_only)])
-def fetch_and_store(user: user_dependency, db: Session = Depends(get_db)):
-    response = requests.get("https://coralvanda.github.io/pokemon_data.json")
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Failed to fetch data.")
+@app.post(
+    "/pokemon/batch",
+    response_model=PokemonBatchOutputSchema,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admin_or_moderator)]
+)
+async def batch_pokemon(body: PokemonBatchInputSchema, user: user_dependency, db: AsyncSession = Depends(get_write_db)):
+    # create/delete items still need the admin role, checked per item
+    try:
+        results = await batch.run_batch(db, body.operations, UserRole(user.get('role')))
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Batch rolled back: {getattr(e, 'orig', None) or e}")
+    return {"results": results}
 
-    data = response.json()
-    pokemon_data = [
-        {
-            "name": pokemon["Name"],
-            "type_1": pokemon["Type 1"],
-            "type_2": pokemon.get("Type 2"),
-            "total": pokemon["Total"],
-            "hp": pokemon["HP"],
-            "attack": pokemon["Attack"],
-            "defense": pokemon["Defense"],
-            "sp_atk": pokemon["Sp. Atk"],
-            "sp_def": pokemon["Sp. Def"],
-            "speed": pokemon["Speed"],
-            "generation": pokemon["Generation"],
-            "legendary": pokemon["Legendary"],
-        }
-        for pokemon in data
-    ]
+
+async def _fetch_and_store_job(job, engine, url: str, batch_size: int):
+    written = 0
+
+    def progress(counters):
+        nonlocal written
+        job.report(counters)
+        # Called after each batch is committed: bump the list version and drop the cached rows and
+        # indexes now, rather than serving replaced rows until the whole ingest is done
+        if counters["inserted"] + counters["updated"] > written:
+            written = counters["inserted"] + counters["updated"]
+            pokemon_changed("reload")
 
     try:
-        # Perform bulk insert using bulk_insert_mappings
-        db.bulk_insert_mappings(models.PokemonData, pokemon_data)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        return await ingest.ingest(engine, url, batch_size, progress=progress)
     finally:
-        db.close()
-    return {"message": "Data successfully stored in the database"}
+        # Batches are committed as they go, so notify even when a later batch failed or the job was cancelled
+        pokemon_changed("reload")
+
+
+@app.post(
+    "/pokemon/fetch_and_store/",
+    response_model=JobSubmittedSchema,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admin_only)]
+)
+async def fetch_and_store(
+        user: user_dependency,
+        response: Response,
+        url: str = Query(ingest.SOURCE_URL, description="JSON feed to ingest"),
+        batch_size: int = Query(ingest.BATCH_SIZE, description="Rows per batch", ge=1, le=10000),
+        db: AsyncSession = Depends(get_write_db)
+):
+    # Local files and stdin are only available through `python ingest.py`
+    if not url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="Only http(s) URLs can be ingested through the API.")
+
+    # The ingest runs in the background on its own connections; only the engine outlives this request
+    engine = db.bind
+    job, created = jobs.job_runner.submit(
+        "fetch_and_store",
+        {"url": url},  # batch_size only changes how the same rows are loaded, so it does not tell jobs apart
+        lambda job: _fetch_and_store_job(job, engine, url, batch_size),
+    )
+    response.headers["Location"] = f"/pokemon/jobs/{job.id}"
+    return {**job.as_dict(), "deduplicated": not created}
+
+
+@app.get("/pokemon/jobs/{job_id}", response_model=JobSchema, dependencies=[Depends(admin_only)])
+async def get_job(job_id: str, user: user_dependency):
+    return jobs.job_runner.get(job_id).as_dict()
+
+
+@app.delete("/pokemon/jobs/{job_id}", response_model=JobSchema, dependencies=[Depends(admin_only)])
+async def cancel_job(job_id: str, user: user_dependency):
+    return (await jobs.job_runner.cancel(job_id)).as_dict()
 
 
 @app.get(
     "/pokemon/",
-    response_model=List[PokemonGetOutputSchema],
+    response_model=Union[List[PokemonGetOutputSchema], PokemonPageSchema, PokemonCursorPageSchema],
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(all_users)]
 )
-def get_pokemon(
+async def get_pokemon(
         user: user_dependency,
+        request: Request,
         sort: str = Query("asc", description="Sort order: 'asc' or 'desc'"),
         keyword: Optional[str] = Query(None, description="Search keyword"),
         col: str = Query("name", description="Column to search in, default 'name'"),
-        limit: int = Query(10, description="Results per page, default 10", le=100),
-        page: int = Query(1, description="Page number"),
-        db: Session = Depends(get_db)
+        limit: int = Query(10, description="Results per page, default 10", ge=1, le=100),
+        page: int = Query(1, description="Page number", ge=1),
+        paginate: str = Query("offset", description="Pagination mode: 'offset' or 'cursor'"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page (implies paginate=cursor)"),
+        filter: Optional[str] = Query(None, description="Filter terms, e.g. 'type_1:eq:Fire,attack:gte:100,speed:between:80..120'"),
+        envelope: bool = Query(False, description="Return {items, total, page, limit, next} instead of a bare list (offset pagination)"),
+        count: str = Query("exact", description="How the envelope total is computed: 'exact' or 'approximate'"),
+        fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. 'id,name,type_1' (default: all)"),
+        db: AsyncSession = Depends(get_read_db)
 ):
-    mapper = inspect(models.PokemonData)
-
-    # Verify column exists in the model
-    if col not in mapper.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{col}' does not exist...")
-
-    # Get the column type
-    column_type = mapper.columns[col].type
-
-    # Validate keyword based on the column's data type
-    if keyword:
-        if isinstance(column_type, Integer) and not keyword.isdigit():
-            raise HTTPException(
-                status_code=400,
-                detail=f"Keyword '{keyword}' is not valid for column '{col}' (expected int)."
-            )
-        elif isinstance(column_type, Boolean) and keyword.lower() not in ["true", "false"]:
-            raise HTTPException(status_code=400,
-                                detail=f"Keyword '{keyword}' is not valid for column '{col}' (expected bool: 'true' or 'false').")
-        elif isinstance(column_type, String) and keyword.isdigit():
-            raise HTTPException(status_code=400,
-                                detail=f"Keyword '{keyword}' is not valid for column '{col}' (expected string).")
-
-    query = db.query(models.PokemonData)
-
-    # Perform search based on keyword
-    if keyword:
-        if isinstance(column_type, String):
-            query = query.filter(getattr(models.PokemonData, col).ilike(f"%{keyword}%"))
-        else:
-            query = query.filter(getattr(models.PokemonData, col) == keyword)
-
-    # Sorting
-    if sort == "asc":
-        query = query.order_by(asc(getattr(models.PokemonData, col)))
-    elif sort == "desc":
-        query = query.order_by(desc(getattr(models.PokemonData, col)))
-    else:
+    # Conditional GET: the ETag only changes when a write bumps the table version, so an
+    # unchanged poll is answered from the counter without touching the database
+    etag = pokemon_version.etag(request.query_params.multi_items())
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return not_modified(etag)
+
+    terms = filters.parse_filter(filter)
+    column_type, keyword_term = filters.keyword_filter(col, keyword)
+    if keyword_term:
+        terms.insert(0, keyword_term)
+    columns = filters.parse_fields(fields)
+
+    if sort not in ("asc", "desc"):
         raise HTTPException(status_code=400, detail="Invalid sort order. Use 'asc' or 'desc'.")
 
-    # Pagination
-    offset = (page - 1) * limit
-    paginated_data = query.offset(offset).limit(limit).all()
-
-    return paginated_data
+    if cursor is not None:
+        paginate = "cursor"
+    if paginate not in ("offset", "cursor"):
+        raise HTTPException(status_code=400, detail="Invalid pagination mode. Use 'offset' or 'cursor'.")
+    if count not in counts.COUNT_MODES:
+        raise HTTPException(status_code=400, detail="Invalid count mode. Use 'exact' or 'approximate'.")
+
+    # Statements are prebuilt per request shape; only the bound values differ between requests.
+    # They return Core rows straight from the database, which are trusted output: the responses
+    # below are encoded directly, without ORM objects or a second pass through response_model.
+    shape = filters.filter_shape(terms)
+    params = filters.filter_params(terms)
+
+    # Offset pagination
+    if paginate == "offset":
+        total = await counts.count_pokemon(db, shape, params, count) if envelope else None
+        params.update(limit=limit, offset=(page - 1) * limit)
+        query = filters.list_statement(shape, col, sort, "offset", columns)
+        paginated_data = (await db.execute(query, params)).mappings().all()
+        items = [dict(row) for row in paginated_data]
+        if not envelope:
+            return ORJSONResponse(items, headers={"ETag": etag})
+        next_page = page + 1 if page * limit < total else None
+        body = {"items": items, "total": total, "page": page, "limit": limit, "next": next_page}
+        return ORJSONResponse(body, headers={"ETag": etag})
+
+    # Keyset pagination: seek past the last (col, id) seen instead of skipping rows
+    if inspect(models.PokemonData).columns[col].nullable:
+        raise HTTPException(status_code=400, detail=f"Cursor pagination is not supported on nullable column '{col}'.")
+
+    mode = "cursor"
+    if cursor:
+        params["seek_value"], params["seek_id"] = decode_cursor(cursor, col, sort, column_type)
+        mode = "seek"
+
+    # Fetch one extra row to know whether another page exists
+    params["limit"] = limit + 1
+    rows = (await db.execute(filters.list_statement(shape, col, sort, mode, columns), params)).mappings().all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(col, sort, last[col], last["id"])
+
+    if filters.selected_columns(columns, col, mode) != columns:
+        # (col, id) were only selected for the cursor
+        items = [{name: row[name] for name in columns} for row in items]
+    else:
+        items = [dict(row) for row in items]
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor}, headers={"ETag": etag})
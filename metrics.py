@@ -0,0 +1,234 @@
+"""Request and SQL instrumentation, exposed in Prometheus text format at GET /metrics.
+
+- `MetricsMiddleware` records per-route latency histograms and status counts,
+  and adds X-Query-Count / X-Query-Time-Ms headers with the number and time
+  of the SQL statements a request ran before its response started.
+- Cursor-execute listeners on every Engine count and time statements, and log
+  those slower than SLOW_QUERY_SECONDS (with their EXPLAIN plan on PostgreSQL
+  when SLOW_QUERY_EXPLAIN is on).
+- `TimedAsyncQueuePool` records how long requests wait to check a connection
+  out of the pool.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+SLOW_QUERY_SECONDS = 0.2
+SLOW_QUERY_EXPLAIN = False  # runs EXPLAIN (not ANALYZE) for slow SELECTs on PostgreSQL
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_log = logging.getLogger("pokemon.slow_query")
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format_labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._counts = {}  # key -> per-bucket counts (non-cumulative), then +Inf
+        self._sums = defaultdict(float)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] += value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+REGISTRY = []
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements run per request.", ("method", "route"), buckets=QUERY_COUNT_BUCKETS
+)
+db_queries = Counter("db_queries_total", "SQL statements executed, by statement type.", ("operation",))
+db_duration = Histogram("db_query_duration_seconds", "SQL statement latency, by statement type.", ("operation",))
+db_slow_queries = Counter("db_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_SECONDS}s.", ("operation",))
+pool_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool.")
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# Per-request SQL counters; set by the middleware, filled in by the cursor listeners
+class RequestStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"]
+    if conn.info.get("explaining"):
+        return
+    operation = _operation(statement)
+    db_queries.inc(operation=operation)
+    db_duration.observe(elapsed, operation=operation)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+    if elapsed >= SLOW_QUERY_SECONDS:
+        db_slow_queries.inc(operation=operation)
+        _log_slow_query(conn, statement, parameters, elapsed, operation, executemany)
+
+
+def _log_slow_query(conn, statement, parameters, elapsed, operation, executemany):
+    plan = None
+    if SLOW_QUERY_EXPLAIN and operation == "SELECT" and not executemany and conn.dialect.name == "postgresql":
+        conn.info["explaining"] = True
+        try:
+            # In a savepoint, so a failing EXPLAIN does not abort the request's transaction
+            with conn.begin_nested():
+                plan = "\n".join(row[0] for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters))
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        finally:
+            conn.info["explaining"] = False
+    slow_query_log.warning(
+        "slow query (%.3fs): %s | params=%r%s", elapsed, statement, parameters, f"\n{plan}" if plan else ""
+    )
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async engine pool that records checkout wait time."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            pool_wait.observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so the per-request SQL counters share the endpoint's context."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-query-count", str(stats.queries).encode()),
+                    (b"x-query-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _request_stats.reset(token)
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status)
+            http_duration.observe(time.perf_counter() - start, method=method, route=route)
+            request_queries.observe(stats.queries, method=method, route=route)
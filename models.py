@@ -1,5 +1,5 @@
 from database import Base, engine
-from sqlalchemy import Column, Integer, String, TIMESTAMP, Boolean, text, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, TIMESTAMP, Boolean, text, Enum, Index, DDL, Table, event
 import enum
 
 
@@ -29,6 +29,65 @@ class PokemonData(Base):
     generation = Column(Integer, nullable=False)
     legendary = Column(Boolean(), nullable=False)
 
+    # Composite (col, id) indexes back the keyset seek used by cursor pagination,
+    # so every page is an index range scan no matter how deep it is. The (name, id)
+    # one is ix_pokemon_data_name_id_covering below.
+    __table_args__ = tuple(
+        Index(f"ix_pokemon_data_{col}_id", col, "id")
+        for col in (
+            "type_1", "total", "hp", "attack", "defense",
+            "sp_atk", "sp_def", "speed", "generation", "legendary",
+        )
+    ) + tuple(
+        # Trigram indexes serve keyword ILIKE '%...%' and /pokemon/search (PostgreSQL only)
+        Index(
+            f"ix_pokemon_data_{col}_trgm", col,
+            postgresql_using="gin", postgresql_ops={col: "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql")
+        for col in ("name", "type_1", "type_2")
+    )
+
+
+# Numeric stat columns aggregated by /pokemon/stats and the summary table
+STAT_COLUMNS = ("total", "hp", "attack", "defense", "sp_atk", "sp_def", "speed")
+SUMMARY_GROUP_COLUMNS = ("type_1", "generation", "legendary")
+
+# Precomputed count/sum/min/max per (type_1, generation, legendary), kept current by the write paths
+pokemon_stats_summary = Table(
+    "pokemon_stats_summary",
+    Base.metadata,
+    Column("type_1", String(40), primary_key=True),
+    Column("generation", Integer, primary_key=True),
+    Column("legendary", Boolean(), primary_key=True),
+    Column("count", Integer, nullable=False),
+    *[
+        Column(f"{stat}_{agg}", BigInteger if agg == "sum" else Integer, nullable=False)
+        for stat in STAT_COLUMNS
+        for agg in ("sum", "min", "max")
+    ],
+)
+
+# Composite indexes for the common filter predicate sets of GET /pokemon/?filter=...:
+# an equality on type_1 followed by a range on a stat
+for _stat in ("attack", "speed", "total"):
+    Index(f"ix_pokemon_data_type_1_{_stat}", PokemonData.type_1, getattr(PokemonData, _stat))
+
+# Lets a summary group be recomputed with an index scan
+Index("ix_pokemon_data_summary_group", PokemonData.type_1, PokemonData.generation, PokemonData.legendary)
+
+# The (name, id) keyset index, also covering the common ?fields=id,name,type_1 list sorted by
+# name, so PostgreSQL can answer it with an index-only scan (INCLUDE is ignored elsewhere)
+Index(
+    "ix_pokemon_data_name_id_covering", PokemonData.name, PokemonData.id,
+    postgresql_include=["type_1"],
+)
+
+event.listen(
+    PokemonData.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
 
 class UserRole(str, enum.Enum):
     admin = "admin"
@@ -39,6 +98,6 @@ class UserRole(str, enum.Enum):
 class Users(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True,)
-    username = Column(String(40), nullable=False)
+    username = Column(String(40), nullable=False, unique=True, index=True)
     hashed_password = Column(String, nullable=False)
     role = Column(Enum(UserRole), default=UserRole.user, nullable=False)
\ No newline at end of file
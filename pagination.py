@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException, status
+from sqlalchemy import Boolean, Integer, String, tuple_
+
+
+# Cursor tokens are opaque to clients: base64 of the last (col value, id) seen
+# plus the column and sort order they were issued for.
+def encode_cursor(col: str, sort: str, value, last_id: int) -> str:
+    payload = json.dumps({"c": col, "s": sort, "v": value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, col: str, sort: str, column_type):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = payload["v"], payload["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    if payload.get("c") != col or payload.get("s") != sort:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor was issued for a different 'col' or 'sort'.",
+        )
+
+    # bool is a subclass of int, so check it before Integer
+    if isinstance(column_type, Boolean):
+        valid = isinstance(value, bool)
+    elif isinstance(column_type, Integer):
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif isinstance(column_type, String):
+        valid = isinstance(value, str)
+    else:
+        valid = False
+    if not valid or not isinstance(last_id, int):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    return value, last_id
+
+
+def seek_condition(column, id_column, sort: str, value, last_id: int):
+    """WHERE clause continuing after (value, last_id) in the given sort order."""
+    if column is id_column:
+        return id_column > last_id if sort == "asc" else id_column < last_id
+    if sort == "asc":
+        return tuple_(column, id_column) > tuple_(value, last_id)
+    return tuple_(column, id_column) < tuple_(value, last_id)
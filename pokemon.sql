@@ -31,3 +31,56 @@ VALUES
 -- pokemon_table_delete_by_id.sql
 DELETE FROM pokemon_data_test_3 WHERE id = 1;
 DELETE FROM pokemon_data_test_3 WHERE name = 'Pikachu';
+
+-- pokemon_table_keyset_indexes.sql
+CREATE INDEX ix_pokemon_data_type_1_id ON pokemon_data (type_1, id);
+CREATE INDEX ix_pokemon_data_total_id ON pokemon_data (total, id);
+CREATE INDEX ix_pokemon_data_hp_id ON pokemon_data (hp, id);
+CREATE INDEX ix_pokemon_data_attack_id ON pokemon_data (attack, id);
+CREATE INDEX ix_pokemon_data_defense_id ON pokemon_data (defense, id);
+CREATE INDEX ix_pokemon_data_sp_atk_id ON pokemon_data (sp_atk, id);
+CREATE INDEX ix_pokemon_data_sp_def_id ON pokemon_data (sp_def, id);
+CREATE INDEX ix_pokemon_data_speed_id ON pokemon_data (speed, id);
+CREATE INDEX ix_pokemon_data_generation_id ON pokemon_data (generation, id);
+CREATE INDEX ix_pokemon_data_legendary_id ON pokemon_data (legendary, id);
+
+-- pokemon_table_remove_duplicate_names.sql
+-- Older fetch_and_store runs inserted the feed again on every call; keep the first copy of each name.
+DELETE FROM pokemon_data a USING pokemon_data b WHERE a.name = b.name AND a.id > b.id;
+
+-- users_username_unique_index.sql
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+
+-- pokemon_table_trigram_indexes.sql
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX ix_pokemon_data_name_trgm ON pokemon_data USING gin (name gin_trgm_ops);
+CREATE INDEX ix_pokemon_data_type_1_trgm ON pokemon_data USING gin (type_1 gin_trgm_ops);
+CREATE INDEX ix_pokemon_data_type_2_trgm ON pokemon_data USING gin (type_2 gin_trgm_ops);
+
+-- pokemon_stats_summary_creation.sql
+CREATE INDEX ix_pokemon_data_summary_group ON pokemon_data (type_1, generation, legendary);
+CREATE TABLE pokemon_stats_summary (
+    type_1 VARCHAR(40) NOT NULL,
+    generation INTEGER NOT NULL,
+    legendary BOOLEAN NOT NULL,
+    count INTEGER NOT NULL,
+    total_sum BIGINT NOT NULL, total_min INTEGER NOT NULL, total_max INTEGER NOT NULL,
+    hp_sum BIGINT NOT NULL, hp_min INTEGER NOT NULL, hp_max INTEGER NOT NULL,
+    attack_sum BIGINT NOT NULL, attack_min INTEGER NOT NULL, attack_max INTEGER NOT NULL,
+    defense_sum BIGINT NOT NULL, defense_min INTEGER NOT NULL, defense_max INTEGER NOT NULL,
+    sp_atk_sum BIGINT NOT NULL, sp_atk_min INTEGER NOT NULL, sp_atk_max INTEGER NOT NULL,
+    sp_def_sum BIGINT NOT NULL, sp_def_min INTEGER NOT NULL, sp_def_max INTEGER NOT NULL,
+    speed_sum BIGINT NOT NULL, speed_min INTEGER NOT NULL, speed_max INTEGER NOT NULL,
+    PRIMARY KEY (type_1, generation, legendary)
+);
+-- fill it with: python stats.py rebuild
+
+-- pokemon_table_filter_indexes.sql
+CREATE INDEX ix_pokemon_data_type_1_attack ON pokemon_data (type_1, attack);
+CREATE INDEX ix_pokemon_data_type_1_speed ON pokemon_data (type_1, speed);
+CREATE INDEX ix_pokemon_data_type_1_total ON pokemon_data (type_1, total);
+
+-- pokemon_table_covering_indexes.sql
+-- replaces the keyset index on (name, id); the covering one serves the same seeks
+DROP INDEX IF EXISTS ix_pokemon_data_name_id;
+CREATE INDEX ix_pokemon_data_name_id_covering ON pokemon_data (name, id) INCLUDE (type_1);
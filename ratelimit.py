@@ -0,0 +1,165 @@
+"""Per-client rate limits and per-route-class admission control.
+
+Authenticated requests draw from a token bucket per user id, sized by the
+user's role (ROLE_QUOTAS). The unauthenticated auth routes draw from a bucket
+per client IP. An empty bucket answers 429 with Retry-After.
+
+Independently, `AdmissionMiddleware` caps the requests in flight per route
+class (IN_FLIGHT_LIMITS) and sheds the excess with 503 + Retry-After right
+away, before they queue up for database connections or worker threads.
+
+Buckets live in process memory. Subclass RateLimitBackend and call
+`set_backend` to share them between workers (e.g. in Redis).
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
+
+from models import UserRole
+
+RATE_LIMITS_ENABLED = True
+
+# (tokens per second, burst size)
+ROLE_QUOTAS = {
+    UserRole.admin: (50, 100),
+    UserRole.moderator: (20, 50),
+    UserRole.user: (10, 20),
+}
+IP_QUOTA = (0.5, 10)  # /auth/token and /auth/user, per client IP
+
+# Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy)
+TRUST_FORWARDED_FOR = False
+
+# Maximum concurrent requests per route class; see route_class()
+IN_FLIGHT_LIMITS = {"read": 200, "write": 50, "bulk": 4, "auth": 16, "stream": 1000}
+SHED_RETRY_AFTER = 1  # seconds
+
+BUCKETS_MAXSIZE = 100000
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    retry_after: float  # seconds until a token is available; 0 when allowed
+
+
+class RateLimitBackend:
+    """Token bucket storage. Subclass it to share buckets between workers."""
+
+    async def take(self, key: str, rate: float, burst: int) -> Decision:
+        raise NotImplementedError
+
+
+class InMemoryBuckets(RateLimitBackend):
+    """Token buckets in a bounded LRU dict. Only touched from the event loop, so no lock is needed."""
+
+    def __init__(self, maxsize: int = BUCKETS_MAXSIZE):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+
+    async def take(self, key, rate, burst):
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            decision = Decision(True, 0)
+            tokens -= 1
+        else:
+            decision = Decision(False, (1 - tokens) / rate)
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)  # the least recently seen bucket, which has likely refilled
+        return decision
+
+
+backend = InMemoryBuckets()
+
+
+def set_backend(new_backend: RateLimitBackend):
+    """Swap the bucket storage, e.g. for one shared between workers."""
+    global backend
+    backend = new_backend
+
+
+async def _take(key: str, quota, detail: str):
+    if not RATE_LIMITS_ENABLED:
+        return
+    decision = await backend.take(key, *quota)
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(math.ceil(decision.retry_after))},
+        )
+
+
+async def limit_user(user: dict):
+    """Charge one request to the user's bucket; called by get_current_user."""
+    try:
+        quota = ROLE_QUOTAS[UserRole(user.get("role"))]
+    except ValueError:
+        quota = ROLE_QUOTAS[UserRole.user]
+    await _take(f"user:{user.get('id')}", quota, "Rate limit exceeded, slow down.")
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_ip(request: Request):
+    """Dependency for routes used before a client has a token."""
+    await _take(f"ip:{client_ip(request)}", IP_QUOTA, "Too many requests from this address, slow down.")
+
+
+def route_class(method: str, path: str):
+    """Admission class of a request, or None for routes that are never shed."""
+    if path in ("/metrics", "/ready"):
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path == "/pokemon/changes":
+        return "stream"  # long-lived SSE connections, kept out of the read slots
+    if path in ("/pokemon/export", "/pokemon/batch", "/pokemon/fetch_and_store/"):
+        return "bulk"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+class AdmissionMiddleware:
+    """Caps in-flight requests per route class, answering 503 immediately once a class is full."""
+
+    def __init__(self, app, limits: dict = None):
+        self.app = app
+        self.limits = limits or IN_FLIGHT_LIMITS
+        self.in_flight = {name: 0 for name in self.limits}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        if self.in_flight[name] >= self.limits[name]:
+            response = ORJSONResponse(
+                {"detail": "Server is busy, try again shortly."},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(SHED_RETRY_AFTER)},
+            )
+            return await response(scope, receive, send)
+
+        self.in_flight[name] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[name] -= 1
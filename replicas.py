@@ -0,0 +1,153 @@
+"""Read/write session routing.
+
+Write routes depend on `get_write_db`, a session on the primary. Read routes
+depend on `get_read_db`, which hands out a session on one of the healthy read
+replicas (database.READ_REPLICA_URLS) in round-robin order, and falls back to
+the primary when there are none.
+
+Replicas are pinged every REPLICA_HEALTH_INTERVAL seconds and skipped while a
+ping or a connection fails. After a user writes, that user's reads stay on the
+primary for STICKY_SECONDS, so they see their own writes despite replica lag.
+
+For REPLICA_LAG_SECONDS after any committed write (by anyone, including bulk
+ingests), every read goes to the primary. List ETags come from the in-process
+table version, which moves as soon as the primary commits, and a detail read
+fills the shared entity cache: served from a lagging replica, either would
+pin old rows under the new version (304s) or in the cache until the next
+write or the TTL. Set it above the replicas' worst expected lag.
+
+Both dependencies build on `database.get_db`, so overriding get_db (as the
+tests and bench.py do) still redirects every route.
+"""
+import asyncio
+import itertools
+import time
+from typing import Annotated, List, Optional
+
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from auth import get_current_user
+from database import get_db, replica_engines
+from hooks import on_pokemon_change
+
+REPLICA_HEALTH_INTERVAL = 5  # seconds between pings
+REPLICA_HEALTH_TIMEOUT = 2  # seconds before a ping counts as failed
+STICKY_SECONDS = 5  # reads go to the primary this long after the user's last write
+REPLICA_LAG_SECONDS = 5  # every read goes to the primary this long after any write
+STICKY_MAXSIZE = 100000
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True
+
+    async def ping(self) -> bool:
+        try:
+            async with self.engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), REPLICA_HEALTH_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+
+class ReplicaSet:
+    def __init__(self, engines):
+        self.replicas: List[Replica] = [Replica(engine) for engine in engines]
+        self._next = itertools.count()
+        self._health_task = None
+        self._written_until = 0.0  # monotonic time until which reads stay on the primary
+
+    def mark_written(self):
+        self._written_until = time.monotonic() + REPLICA_LAG_SECONDS
+
+    def recently_written(self) -> bool:
+        return self._written_until > time.monotonic()
+
+    def pick(self) -> Optional[Replica]:
+        """The next healthy replica in round-robin order, or None to use the primary."""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    async def check(self):
+        results = await asyncio.gather(*[replica.ping() for replica in self.replicas])
+        for replica, healthy in zip(self.replicas, results):
+            replica.healthy = healthy
+
+    def ensure_health_checks(self):
+        """Start the background ping loop on the running event loop, once."""
+        if not self.replicas or (self._health_task is not None and not self._health_task.done()):
+            return
+        self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    async def _health_loop(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+
+
+class StickyWrites:
+    """User id -> time until which the user's reads are pinned to the primary."""
+
+    def __init__(self, maxsize: int = STICKY_MAXSIZE):
+        self.maxsize = maxsize
+        self._until = {}
+
+    def mark(self, user_id):
+        if len(self._until) >= self.maxsize:
+            now = time.monotonic()
+            self._until = {uid: until for uid, until in self._until.items() if until > now}
+        self._until[user_id] = time.monotonic() + STICKY_SECONDS
+
+    def is_sticky(self, user_id) -> bool:
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+
+replica_set = ReplicaSet(replica_engines)
+sticky_writes = StickyWrites()
+
+
+@on_pokemon_change
+def _mark_replicas_behind(op: str, pokemon, fields):
+    replica_set.mark_written()
+
+
+async def get_write_db(user: Annotated[dict, Depends(get_current_user)], db: AsyncSession = Depends(get_db)):
+    sticky_writes.mark(user.get('id'))
+    try:
+        yield db
+    finally:
+        # Marked again once the write is done, so the window covers the reads that follow it
+        sticky_writes.mark(user.get('id'))
+
+
+async def get_read_db(user: Annotated[dict, Depends(get_current_user)], primary: AsyncSession = Depends(get_db)):
+    # The primary session is only connected if it ends up being used
+    if sticky_writes.is_sticky(user.get('id')) or replica_set.recently_written():
+        replica = None
+    else:
+        replica = replica_set.pick()
+    if replica is None:
+        yield primary
+        return
+
+    replica_set.ensure_health_checks()
+    async with replica.sessionmaker() as db:
+        try:
+            yield db
+        except (OperationalError, InterfaceError):
+            # Lost or refused connection: skip this replica until the next successful ping
+            replica.healthy = False
+            raise
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 
 # Base schema for Pydantic models
@@ -39,6 +40,22 @@ class PokemonPatchInputSchema(BaseModel):
     legendary: Optional[bool]
 
 
+class PokemonBatchOperation(BaseModel):
+    op: Literal["create", "update", "patch", "delete"]
+    id: Optional[int] = None  # required for update, patch and delete
+    data: Optional[dict] = None  # validated as PokemonPostPutInputSchema (create/update) or PokemonPatchInputSchema (patch)
+
+
+class PokemonBatchInputSchema(BaseModel):
+    operations: List[PokemonBatchOperation] = Field(min_length=1, max_length=10000)
+
+
+class PokemonSimilarInputSchema(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+    k: int = Field(default=20, ge=1, le=100)
+    metric: Literal["euclidean", "cosine"] = "euclidean"
+
+
 # Output Schemas
 class PokemonGetOutputSchema(BaseModel):
     id: int
@@ -56,6 +73,87 @@ class PokemonGetOutputSchema(BaseModel):
     legendary: bool
 
 
+class PokemonSearchResultSchema(PokemonGetOutputSchema):
+    score: float
+
+
+class PokemonNeighbourSchema(BaseModel):
+    id: int
+    name: str
+    distance: float
+
+
+class PokemonSimilarOutputSchema(BaseModel):
+    id: int
+    metric: str
+    similar: List[PokemonNeighbourSchema]
+
+
+class PokemonSimilarBatchOutputSchema(BaseModel):
+    results: List[PokemonSimilarOutputSchema]
+
+
+class PokemonLeaderboardEntrySchema(BaseModel):
+    rank: int
+    id: int
+    name: str
+    type_1: str
+    type_2: Optional[str] = None
+    generation: int
+    value: int
+
+
+class PokemonLeaderboardSchema(BaseModel):
+    stat: str
+    type_1: Optional[str] = None
+    generation: Optional[int] = None
+    items: List[PokemonLeaderboardEntrySchema]
+
+
+class PokemonPageSchema(BaseModel):
+    items: List[PokemonGetOutputSchema]
+    total: int
+    page: int
+    limit: int
+    next: Optional[int] = None
+
+
+class PokemonCursorPageSchema(BaseModel):
+    items: List[PokemonGetOutputSchema]
+    next_cursor: Optional[str] = None
+
+
+class PokemonBatchItemResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None
+    status: int
+    data: Optional[PokemonGetOutputSchema] = None
+    error: Optional[str] = None
+
+
+class PokemonBatchOutputSchema(BaseModel):
+    results: List[PokemonBatchItemResult]
+
+
+class JobSchema(BaseModel):
+    id: str
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    params: dict
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    rows_processed: int
+    rows_per_second: Optional[float] = None
+    progress: dict
+    error: Optional[str] = None
+
+
+class JobSubmittedSchema(JobSchema):
+    deduplicated: bool  # an identical job was already queued or running; this is that job
+
+
 class DeleteResponse(BaseModel):
     message: str
 
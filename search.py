@@ -0,0 +1,115 @@
+"""Relevance-ranked, typo-tolerant search over name / type_1 / type_2.
+
+On PostgreSQL the work is done by pg_trgm: trigram GIN indexes serve both the
+`%>` word-similarity match and the keyword ILIKE filter of GET /pokemon/.
+Other databases (SQLite in tests and benchmarks) use an in-process trigram
+inverted index with the same scoring idea, kept current by the write hooks.
+"""
+import re
+from collections import defaultdict
+
+from sqlalchemy import func, or_, select
+
+import models
+from hooks import DerivedIndex, on_pokemon_change
+
+SEARCH_COLUMNS = ("name", "type_1", "type_2")
+
+# Minimum share of the query's trigrams a field must contain to match
+# (the same meaning as pg_trgm.word_similarity_threshold, which defaults to 0.6)
+SIMILARITY_THRESHOLD = 0.6
+
+_word = re.compile(r"[^\W_]+")
+
+
+def trigrams(text) -> set:
+    """pg_trgm-style trigrams: lower-cased words padded with two leading and one trailing blank."""
+    grams = set()
+    for word in _word.findall((text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NGramIndex(DerivedIndex):
+    """Trigram inverted index: trigram -> ids, plus the trigram sets of each document's fields."""
+
+    def __init__(self):
+        super().__init__()
+        self.postings = defaultdict(set)
+        self.documents = {}  # id -> tuple of trigram sets, one per SEARCH_COLUMNS
+
+    def add(self, row: dict):
+        self.remove(row["id"])
+        fields = tuple(trigrams(row.get(col)) for col in SEARCH_COLUMNS)
+        self.documents[row["id"]] = fields
+        for gram in set().union(*fields):
+            self.postings[gram].add(row["id"])
+
+    def remove(self, pokemon_id: int):
+        fields = self.documents.pop(pokemon_id, None)
+        if fields is None:
+            return
+        for gram in set().union(*fields):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(pokemon_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def clear(self):
+        self.postings.clear()
+        self.documents.clear()
+
+    async def load(self, db):
+        table = models.PokemonData.__table__
+        result = await db.execute(select(table.c.id, *[table.c[col] for col in SEARCH_COLUMNS]))
+        for row in result.mappings():
+            self.add(row)
+
+    def search(self, q: str, limit: int):
+        """Return [(id, score)] best first. Only postings of the query's trigrams are visited."""
+        query = trigrams(q)
+        if not query:
+            return []
+
+        # Count shared trigrams per candidate across all fields; this bounds every field's score
+        counts = defaultdict(int)
+        for gram in query:
+            for pokemon_id in self.postings.get(gram, ()):
+                counts[pokemon_id] += 1
+
+        needed = SIMILARITY_THRESHOLD * len(query)
+        scored = []
+        for pokemon_id, count in counts.items():
+            if count < needed:
+                continue
+            score = max(len(query & field) for field in self.documents[pokemon_id]) / len(query)
+            if score >= SIMILARITY_THRESHOLD:
+                scored.append((score, pokemon_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(pokemon_id, score) for score, pokemon_id in scored[:limit]]
+
+
+ngram_index = NGramIndex()
+on_pokemon_change(ngram_index.on_change)
+
+
+async def search_pokemon(db, q: str, limit: int):
+    """Return [(row mapping, score)] for the best matches of `q`."""
+    table = models.PokemonData.__table__
+
+    if db.bind.dialect.name == "postgresql":
+        score = func.greatest(*[func.word_similarity(q, table.c[col]) for col in SEARCH_COLUMNS])
+        match = or_(*[table.c[col].op("%>")(q) for col in SEARCH_COLUMNS])
+        stmt = select(table, score.label("score")).where(match).order_by(score.desc(), table.c.id).limit(limit)
+        rows = (await db.execute(stmt)).mappings().all()
+        return [(row, row["score"]) for row in rows]
+
+    await ngram_index.ensure_loaded(db)
+    hits = ngram_index.search(q, limit)
+    if not hits:
+        return []
+    rows = (await db.execute(select(table).where(table.c.id.in_([pokemon_id for pokemon_id, _ in hits])))).mappings()
+    by_id = {row["id"]: row for row in rows}
+    return [(by_id[pokemon_id], score) for pokemon_id, score in hits if pokemon_id in by_id]
@@ -0,0 +1,115 @@
+"""In-memory column store of the stat vectors, behind the "similar pokemon" endpoints.
+
+Every row's (total, hp, attack, defense, sp_atk, sp_def, speed) is kept in one
+NumPy matrix next to its id and name. A k-NN query computes the distances from
+the query rows to every row in a single matrix product and selects the k
+smallest with `argpartition`, so it never touches the database. The snapshot is
+loaded on first use and kept current by the write hooks.
+"""
+import numpy as np
+from sqlalchemy import select
+
+import models
+from hooks import DerivedIndex, on_pokemon_change
+from models import STAT_COLUMNS
+
+METRICS = ("euclidean", "cosine")
+INITIAL_CAPACITY = 1024
+
+
+class StatSnapshot(DerivedIndex):
+    """Row-aligned arrays: ids, names and the stat matrix, with an id -> row position map."""
+
+    def __init__(self):
+        super().__init__()
+        self._alloc(INITIAL_CAPACITY)
+        self.size = 0
+        self.positions = {}
+
+    def _alloc(self, capacity: int):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.names = np.empty(capacity, dtype=object)
+        self.vectors = np.zeros((capacity, len(STAT_COLUMNS)), dtype=np.float64)
+        self.sq_norms = np.zeros(capacity, dtype=np.float64)
+
+    def _grow(self):
+        ids, names, vectors, sq_norms = self.ids, self.names, self.vectors, self.sq_norms
+        self._alloc(2 * len(ids))
+        self.ids[:self.size], self.names[:self.size] = ids[:self.size], names[:self.size]
+        self.vectors[:self.size], self.sq_norms[:self.size] = vectors[:self.size], sq_norms[:self.size]
+
+    def add(self, row: dict):
+        position = self.positions.get(row["id"])
+        if position is None:
+            if self.size == len(self.ids):
+                self._grow()
+            position = self.size
+            self.size += 1
+            self.positions[row["id"]] = position
+        vector = [row[col] for col in STAT_COLUMNS]
+        self.ids[position], self.names[position] = row["id"], row["name"]
+        self.vectors[position] = vector
+        self.sq_norms[position] = self.vectors[position] @ self.vectors[position]
+
+    def remove(self, pokemon_id: int):
+        # Move the last row into the freed slot so the live rows stay contiguous
+        position = self.positions.pop(pokemon_id, None)
+        if position is None:
+            return
+        last = self.size - 1
+        if position != last:
+            self.ids[position], self.names[position] = self.ids[last], self.names[last]
+            self.vectors[position], self.sq_norms[position] = self.vectors[last], self.sq_norms[last]
+            self.positions[int(self.ids[position])] = position
+        self.names[last] = None
+        self.size = last
+
+    def clear(self):
+        self._alloc(INITIAL_CAPACITY)
+        self.size = 0
+        self.positions.clear()
+
+    async def load(self, db):
+        table = models.PokemonData.__table__
+        result = await db.execute(select(table.c.id, table.c.name, *[table.c[col] for col in STAT_COLUMNS]))
+        for row in result.mappings():
+            self.add(row)
+
+    def missing(self, pokemon_ids) -> list:
+        return [pokemon_id for pokemon_id in pokemon_ids if pokemon_id not in self.positions]
+
+    def nearest(self, pokemon_ids, k: int, metric: str = "euclidean"):
+        """Return, for each id, its k nearest other rows as [(id, name, distance)], closest first."""
+        n = self.size
+        k = min(k, n - 1)
+        if k <= 0:
+            return [[] for _ in pokemon_ids]
+
+        rows = np.fromiter((self.positions[pokemon_id] for pokemon_id in pokemon_ids), dtype=np.int64)
+        vectors, sq_norms = self.vectors[:n], self.sq_norms[:n]
+        dots = vectors[rows] @ vectors.T  # (queries, n)
+
+        if metric == "cosine":
+            norms = np.sqrt(sq_norms)
+            norms[norms == 0] = 1.0  # an all-zero vector is equally far from everything
+            distances = 1.0 - dots / (norms[rows, None] * norms[None, :])
+        else:
+            # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b; the square root is only taken for the k winners
+            distances = np.maximum(sq_norms[rows, None] + sq_norms[None, :] - 2.0 * dots, 0.0)
+        distances[np.arange(len(rows)), rows] = np.inf  # never match a row with itself
+
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(distances, nearest, axis=1)
+        order = np.lexsort((self.ids[nearest], best), axis=1)
+        nearest, best = np.take_along_axis(nearest, order, axis=1), np.take_along_axis(best, order, axis=1)
+        if metric == "euclidean":
+            best = np.sqrt(best)
+
+        return [
+            [(int(self.ids[j]), self.names[j], round(float(d), 6)) for j, d in zip(row_nearest, row_best)]
+            for row_nearest, row_best in zip(nearest, best)
+        ]
+
+
+stat_snapshot = StatSnapshot()
+on_pokemon_change(stat_snapshot.on_change)
@@ -0,0 +1,161 @@
+"""Application lifespan: schema bootstrap, warm-up and readiness.
+
+On startup the schema is created (CREATE_SCHEMA_ON_STARTUP) and/or checked
+(VERIFY_SCHEMA_ON_STARTUP) before the app accepts requests; a missing table
+stops the process right away (pokemon_stats_summary only counts as missing
+when stats.STATS_SUMMARY_ENABLED is set). Warm-up then runs in the background:
+
+- POOL_WARMUP_CONNECTIONS connections are opened on the primary and on each
+  replica, so the first requests do not pay for connection setup;
+- the hot statements (statements.py and the default list query) are executed
+  once on each of those connections, which compiles them into SQLAlchemy's
+  statement cache and has asyncpg prepare them; writes run in a transaction
+  that is rolled back and match no rows;
+- the in-memory stat snapshot, the leaderboards and, off PostgreSQL, the
+  search index are loaded.
+
+GET /ready answers 503 until warm-up has finished, then 200, so a load
+balancer can hold traffic until then. A failed warm-up is retried.
+"""
+import asyncio
+import contextlib
+import logging
+
+from sqlalchemy import inspect
+
+import database
+import filters
+import leaderboard
+import models  # registers the tables on database.Base.metadata
+import search
+import snapshot
+import statements
+import stats
+from replicas import replica_set
+from schema import PokemonPostPutInputSchema
+
+CREATE_SCHEMA_ON_STARTUP = False  # create missing tables and indexes, as create_db.py does
+VERIFY_SCHEMA_ON_STARTUP = True
+POOL_WARMUP_CONNECTIONS = 5  # per engine; at most DB_POOL_SIZE, as overflow connections are not kept
+WARM_CACHES_ON_STARTUP = True
+WARMUP_RETRY_SECONDS = 5
+
+logger = logging.getLogger("pokemon.startup")
+
+# Executed on every warmed connection; pokemon id -1 never exists
+_WARMUP_PARAMS = {"pokemon_id": -1}
+READ_STATEMENTS = [
+    (statements.by_id, _WARMUP_PARAMS),
+    (filters.list_statement((), "name", "asc", "offset", filters.OUTPUT_COLUMNS), {"limit": 10, "offset": 0}),
+    (filters.list_statement((), "name", "asc", "cursor", filters.OUTPUT_COLUMNS), {"limit": 11}),
+]
+WRITE_STATEMENTS = [
+    # PUT sets every input column; PATCH column subsets are compiled on first use
+    (statements.update_returning, {**{col: None for col in PokemonPostPutInputSchema.model_fields}, **_WARMUP_PARAMS}),
+    (statements.delete_returning, _WARMUP_PARAMS),
+]
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.detail = "starting"
+
+    def set(self, ready: bool, detail: str):
+        self.ready, self.detail = ready, detail
+
+
+readiness = Readiness()
+
+
+async def bootstrap_schema(engine):
+    if CREATE_SCHEMA_ON_STARTUP:
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+    if VERIFY_SCHEMA_ON_STARTUP:
+        async with engine.connect() as conn:
+            missing_tables, missing_indexes = await conn.run_sync(_missing_schema)
+        if missing_tables:
+            raise RuntimeError(
+                f"Missing tables: {', '.join(missing_tables)}. Run create_db.py or set CREATE_SCHEMA_ON_STARTUP."
+            )
+        if missing_indexes:
+            logger.warning("Missing indexes: %s", ", ".join(missing_indexes))
+
+
+def _missing_schema(sync_conn):
+    inspector = inspect(sync_conn)
+    existing = set(inspector.get_table_names())
+    # The stats summary table is opt-in, so it is only required once it is enabled
+    optional = set() if stats.STATS_SUMMARY_ENABLED else {models.pokemon_stats_summary.name}
+    missing_tables = [name for name in database.Base.metadata.tables if name not in existing | optional]
+    missing_indexes = []
+    # Some indexes are PostgreSQL-only, so indexes are only checked there
+    if sync_conn.dialect.name == "postgresql":
+        for name, table in database.Base.metadata.tables.items():
+            if name in existing:
+                present = {index["name"] for index in inspector.get_indexes(name)}
+                missing_indexes += [index.name for index in table.indexes if index.name not in present]
+    return missing_tables, missing_indexes
+
+
+async def warm_pool(engine, connections: int, hot_statements):
+    """Open `connections` pooled connections at once and run the hot statements on each."""
+    connections = min(connections, database.DB_POOL_SIZE)
+    if connections <= 0:
+        return
+    async with contextlib.AsyncExitStack() as stack:
+        # All held at the same time, so the pool really opens that many
+        conns = await asyncio.gather(*[stack.enter_async_context(engine.connect()) for _ in range(connections)])
+        await asyncio.gather(*[_run_statements(conn, hot_statements) for conn in conns])
+
+
+async def _run_statements(conn, hot_statements):
+    try:
+        for stmt, params in hot_statements:
+            await conn.execute(stmt, params)
+    finally:
+        await conn.rollback()
+
+
+async def warm_caches():
+    async with database.AsyncSessionLocal() as db:
+        await snapshot.stat_snapshot.ensure_loaded(db)
+        await leaderboard.leaderboards.ensure_loaded(db)
+        if db.bind.dialect.name != "postgresql":
+            await search.ngram_index.ensure_loaded(db)
+
+
+async def warm_up():
+    while True:
+        try:
+            await warm_pool(database.async_engine, POOL_WARMUP_CONNECTIONS, READ_STATEMENTS + WRITE_STATEMENTS)
+            for replica in replica_set.replicas:
+                await warm_pool(replica.engine, POOL_WARMUP_CONNECTIONS, READ_STATEMENTS)
+            if WARM_CACHES_ON_STARTUP:
+                await warm_caches()
+        except Exception:
+            logger.exception("Warm-up failed, retrying in %s seconds", WARMUP_RETRY_SECONDS)
+            readiness.set(False, "warm-up failed, retrying")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+            continue
+        readiness.set(True, "ready")
+        logger.info("Warm-up finished")
+        return
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    readiness.set(False, "starting")
+    await bootstrap_schema(database.async_engine)
+    replica_set.ensure_health_checks()
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        readiness.set(False, "shutting down")
+        warm_up_task.cancel()
+        replica_set.stop_health_checks()
+        await database.async_engine.dispose()
+        for replica in replica_set.replicas:
+            await replica.engine.dispose()
@@ -0,0 +1,40 @@
+"""Prebuilt statements for the hottest single-row routes.
+
+They are built once at import with named bind parameters, so every request
+executes the same statement object: SQLAlchemy compiles each one once per
+engine (its compiled cache is keyed on the statement's structure) and asyncpg
+prepares it once per connection. startup.py executes them on each pooled
+connection before the first request, so neither cost lands on live traffic.
+List statements are prebuilt per request shape in filters.list_statement.
+"""
+from functools import lru_cache
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+import models
+
+table = models.PokemonData.__table__
+
+# GET /pokemon/{pokemon_id}; binds pokemon_id
+by_id = select(table).where(table.c.id == bindparam("pokemon_id"))
+
+
+@lru_cache(maxsize=256)
+def by_id_fields(fields: tuple):
+    """GET /pokemon/{pokemon_id}?fields=...: selects only `fields`; binds pokemon_id."""
+    return select(*[table.c[col] for col in fields]).where(table.c.id == bindparam("pokemon_id"))
+
+
+# POST /pokemon; binds the new row's columns
+insert_returning = insert(table).returning(table)
+
+# PUT/PATCH /pokemon/{pokemon_id}; binds pokemon_id plus the columns to set, which
+# determine the SET clause (each distinct set of columns is compiled once)
+update_returning = update(table).where(table.c.id == bindparam("pokemon_id")).returning(table)
+
+# DELETE /pokemon/{pokemon_id}; binds pokemon_id and returns the row's stats summary group
+delete_returning = (
+    delete(table)
+    .where(table.c.id == bindparam("pokemon_id"))
+    .returning(*[table.c[col] for col in models.SUMMARY_GROUP_COLUMNS])
+)
@@ -0,0 +1,199 @@
+"""Aggregations behind GET /pokemon/stats and the optional summary table.
+
+A request such as `group_by=type_1,generation&metrics=avg:attack,p95:speed`
+compiles to a single GROUP BY. When the summary table is enabled and the
+request only needs count/sum/avg/min/max over (a subset of) type_1,
+generation and legendary, it is answered by rolling up the precomputed rows
+of `pokemon_stats_summary` instead of scanning pokemon_data.
+
+The write paths keep the summary current by recomputing only the groups they
+touched, inside their own transaction. After enabling it on an existing
+database, fill it once with:
+
+    python stats.py rebuild
+"""
+import asyncio
+import re
+import sys
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import Float, and_, cast, delete, func, insert, select
+
+import models
+from models import STAT_COLUMNS, SUMMARY_GROUP_COLUMNS, pokemon_stats_summary as summary
+
+# Maintaining the summary costs a few extra statements per write, so it is opt-in
+STATS_SUMMARY_ENABLED = False
+
+GROUP_COLUMNS = ("type_1", "type_2", "generation", "legendary")
+AGGREGATES = ("count", "sum", "avg", "min", "max", "stddev")
+SUMMARY_AGGREGATES = ("count", "sum", "avg", "min", "max")
+MAX_METRICS = 20
+
+_percentile = re.compile(r"^p([1-9][0-9]?)$")
+
+table = models.PokemonData.__table__
+
+
+def parse_group_by(group_by: str):
+    cols = []
+    for col in filter(None, (part.strip() for part in group_by.split(","))):
+        if col not in GROUP_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Cannot group by '{col}'. Use {', '.join(GROUP_COLUMNS)}.")
+        if col not in cols:
+            cols.append(col)
+    return cols
+
+
+def parse_metrics(metrics: str):
+    """Parse 'count,avg:attack,p95:speed' into [(name, aggregate, column or None)]."""
+    parsed = []
+    for metric in filter(None, (part.strip() for part in metrics.split(","))):
+        agg, _, col = metric.partition(":")
+        if agg == "count" and not col:
+            parsed.append(("count", "count", None))
+            continue
+        if agg not in AGGREGATES and not _percentile.match(agg):
+            raise HTTPException(status_code=400, detail=f"Unknown aggregate '{agg}'. Use {', '.join(AGGREGATES)} or p1..p99.")
+        if col not in STAT_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Cannot aggregate '{col}'. Use {', '.join(STAT_COLUMNS)}.")
+        parsed.append((f"{agg}_{col}", agg, col))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="At least one metric is required.")
+    if len(parsed) > MAX_METRICS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_METRICS} metrics are allowed.")
+    return parsed
+
+
+def _table_aggregate(agg: str, col, dialect: str):
+    if agg == "count":
+        return func.count() if col is None else func.count(col)
+    if agg == "avg":
+        return func.avg(col)
+    if agg in ("sum", "min", "max"):
+        return getattr(func, agg)(col)
+    if dialect != "postgresql":
+        raise HTTPException(status_code=400, detail="stddev and percentiles require PostgreSQL.")
+    if agg == "stddev":
+        return func.stddev_samp(col)
+    fraction = int(_percentile.match(agg).group(1)) / 100
+    return func.percentile_cont(fraction).within_group(col)
+
+
+def _summary_aggregate(agg: str, col: str):
+    if agg == "count":
+        return func.coalesce(func.sum(summary.c.count), 0)
+    if agg == "sum":
+        return func.sum(summary.c[f"{col}_sum"])
+    if agg == "avg":
+        return cast(func.sum(summary.c[f"{col}_sum"]), Float) / func.sum(summary.c.count)
+    if agg == "min":
+        return func.min(summary.c[f"{col}_min"])
+    return func.max(summary.c[f"{col}_max"])
+
+
+def uses_summary(group_cols, metrics) -> bool:
+    return (
+        STATS_SUMMARY_ENABLED
+        and all(col in SUMMARY_GROUP_COLUMNS for col in group_cols)
+        and all(agg in SUMMARY_AGGREGATES for _, agg, _ in metrics)
+    )
+
+
+def compile_stats(group_cols, metrics, dialect: str):
+    """Build the single GROUP BY statement answering the request. Returns (source, statement)."""
+    if uses_summary(group_cols, metrics):
+        source, keys = "summary", [summary.c[col] for col in group_cols]
+        aggregates = [_summary_aggregate(agg, col).label(name) for name, agg, col in metrics]
+    else:
+        source, keys = "table", [table.c[col] for col in group_cols]
+        aggregates = [
+            _table_aggregate(agg, table.c[col] if col else None, dialect).label(name) for name, agg, col in metrics
+        ]
+    stmt = select(*keys, *aggregates).select_from(summary if source == "summary" else table)
+    if keys:
+        stmt = stmt.group_by(*keys).order_by(*keys)
+    return source, stmt
+
+
+async def get_stats(db, group_by: str, metrics: str):
+    group_cols, parsed = parse_group_by(group_by), parse_metrics(metrics)
+    source, stmt = compile_stats(group_cols, parsed, db.bind.dialect.name)
+    rows = (await db.execute(stmt)).mappings().all()
+    groups = [{key: float(value) if isinstance(value, Decimal) else value for key, value in row.items()} for row in rows]
+    return {"source": source, "groups": groups}
+
+
+def group_key(row) -> tuple:
+    return tuple(row[col] if isinstance(row, dict) else getattr(row, col) for col in SUMMARY_GROUP_COLUMNS)
+
+
+async def summary_keys_for_ids(db, ids):
+    """Groups the given rows belong to right now, before they are updated or deleted."""
+    if not STATS_SUMMARY_ENABLED or not ids:
+        return []
+    keys = [table.c[col] for col in SUMMARY_GROUP_COLUMNS]
+    return [tuple(row) for row in await db.execute(select(*keys).where(table.c.id.in_(ids)).distinct())]
+
+
+def _summary_values():
+    columns = [func.count().label("count")]
+    for stat in STAT_COLUMNS:
+        columns += [
+            func.sum(table.c[stat]).label(f"{stat}_sum"),
+            func.min(table.c[stat]).label(f"{stat}_min"),
+            func.max(table.c[stat]).label(f"{stat}_max"),
+        ]
+    return columns
+
+
+async def refresh_summary_groups(db, keys):
+    """Recompute the summary rows of the given (type_1, generation, legendary) groups.
+
+    Runs inside the caller's transaction, after its changes are flushed. On
+    PostgreSQL a transaction-scoped advisory lock per group serializes writers,
+    so the recount always sees the other writer's committed rows.
+    """
+    if not STATS_SUMMARY_ENABLED:
+        return
+    postgres = db.bind.dialect.name == "postgresql"
+    for key in sorted(set(keys), key=repr):
+        if postgres:
+            await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"pokemon_stats_summary:{key!r}"))))
+        match = and_(*[table.c[col] == value for col, value in zip(SUMMARY_GROUP_COLUMNS, key)])
+        row = (await db.execute(select(*_summary_values()).where(match))).mappings().one()
+        await db.execute(
+            delete(summary).where(and_(*[summary.c[col] == value for col, value in zip(SUMMARY_GROUP_COLUMNS, key)]))
+        )
+        if row["count"]:
+            await db.execute(insert(summary).values(**dict(zip(SUMMARY_GROUP_COLUMNS, key)), **row))
+
+
+async def rebuild_summary(conn):
+    """Recompute the whole summary table from pokemon_data in one statement."""
+    if not STATS_SUMMARY_ENABLED:
+        return
+    keys = [table.c[col] for col in SUMMARY_GROUP_COLUMNS]
+    await conn.execute(delete(summary))
+    await conn.execute(
+        insert(summary).from_select(
+            list(SUMMARY_GROUP_COLUMNS) + [c.name for c in _summary_values()],
+            select(*keys, *_summary_values()).group_by(*keys),
+        )
+    )
+    await conn.commit()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python stats.py rebuild")
+
+    from database import async_engine
+
+    async def _rebuild():
+        async with async_engine.connect() as conn:
+            await rebuild_summary(conn)
+
+    STATS_SUMMARY_ENABLED = True
+    asyncio.run(_rebuild())